@@ -125,7 +125,7 @@ class EntitySearchScreen(Screen):
                 if context.other_entities:
                     markdown_lines.extend([
                         "### Other Entities in this Context",
-                        *[f"- **{e['text']}** ({e['type']})" for e in context.other_entities],
+                        *[f"- **{e_text}** ({e_type})" for e_text, e_type in context.other_entities],
                         ""
                     ])
 
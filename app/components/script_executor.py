@@ -197,20 +197,20 @@ class ScriptExecutorScreen(Screen):
     def join_files(self, file_paths):
         script_dir = Path(__file__).parent.parent.parent
         
-        temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False)
-        temp_path = temp_file.name
+        fd, temp_path = tempfile.mkstemp(suffix='.txt')
         
         try:
-            with open(temp_path, 'w', encoding='utf-8') as outfile:
+            # Reuse the descriptor mkstemp opened and write the joined content once
+            with os.fdopen(fd, 'wb') as outfile:
+                parts = []
                 for i, file_path in enumerate(file_paths):
                     full_path = script_dir / file_path
                     if full_path.exists():
                         if i > 0:
-                            outfile.write("\n" + "="*50 + f" FILE: {full_path.name} " + "="*50 + "\n")
-                        
-                        with open(full_path, 'r', encoding='utf-8') as infile:
-                            outfile.write(infile.read())
-                            outfile.write("\n")
+                            parts.append(("\n" + "="*50 + f" FILE: {full_path.name} " + "="*50 + "\n").encode('utf-8'))
+                        parts.append(full_path.read_bytes())
+                        parts.append(b"\n")
+                outfile.write(b"".join(parts))
             
             return temp_path
         except Exception as e:
@@ -369,6 +369,6 @@ class ScriptExecutorScreen(Screen):
             log.write(f"Error: {str(e)}\n")
         finally:
             # Clean up temporary file if it was created
-            if temp_file_path and Path(temp_file_path).exists():
+            if temp_file_path:
                 Path(temp_file_path).unlink(missing_ok=True)
                 log.write("Temporary joined file cleaned up.\n")
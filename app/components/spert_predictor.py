@@ -3,15 +3,61 @@ from textual.containers import Vertical, Horizontal
 from textual.widgets import Button, Input, Label, Select, RichLog
 from textual.screen import Screen
 from textual import work
-import re
+from textual.worker import WorkerError
+import asyncio
+from contextlib import suppress
+import os
 from pathlib import Path
-import subprocess
-import json
-from typing import Dict, Any
+from typing import Dict, List, Tuple
+from utils.process_output import stream_output, stop_process_group
+from utils.log_flusher import LogFlusher
 
-class SpertPredictorScreen(Screen):
+_APP_DIR = Path(__file__).resolve().parent.parent
+_ROOT_DIR = _APP_DIR.parent
+_SPERT_DIR = _ROOT_DIR / "spert"
+_SPERT_VENV = _SPERT_DIR / ".spert_env"
+_SPERT_VENV_PY = _SPERT_VENV / "bin" / "python"
+
+def read_config_runs(content: str) -> List[Tuple[int, Dict[str, str]]]:
+    """Split a SpERT config into its runs as (repeat, entries), following SpERT's own config reader"""
+    runs = []
+    repeat, entries = 1, {}
+    for line in content.splitlines():
+        line = line.strip()
+        if line.startswith("#"):
+            continue
+        if not line:
+            # A blank line ends the current run
+            if entries:
+                runs.append((repeat, entries))
+            repeat, entries = 1, {}
+        elif line.startswith("[") and line.endswith("]"):
+            repeat = int(line[1:-1])
+        else:
+            key, _, value = line.partition("=")
+            entries[key.strip()] = value.strip()
+    if entries:
+        runs.append((repeat, entries))
+    return runs
+
+def config_to_args(config: Dict[str, str]) -> list:
+    """Convert config entries to SpERT command-line flags, following SpERT's own config reader"""
+    args = []
+    for key, value in config.items():
+        if value.lower() == "true":
+            args.append(f"--{key}")
+        elif value.lower() != "false":
+            # Multi-word values become one argument per word, as in SpERT's _convert_config
+            args.extend([f"--{key}", *value.split(" ")])
+    return args
+
+
+class SpertPredictorScreen(LogFlusher, Screen):
     """Screen for configuring and running SpERT prediction"""
 
+    # Directories already created during this session
+    _ensured_dirs: set = set()
+
     def compose(self) -> ComposeResult:
         with Vertical(id="predictor-container"):
             yield Label("SpERT Prediction", id="predictor-title")
@@ -20,20 +66,14 @@ class SpertPredictorScreen(Screen):
             yield Label("Data Preparation", id="data-prep-title")
             with Horizontal(id="data-prep-row"):
                 yield Label("Input File:", id="input-label")
-                yield Select(
-                    self.get_preprocessed_files(),
-                    id="input-select"
-                )
+                yield Select([], id="input-select")
                 yield Button("Prepare Data", id="prepare-button", variant="success")
 
             # Configuration Section
             yield Label("Prediction Configuration", id="prediction-config-title")
             with Horizontal(id="config-row"):
                 yield Label("Config:", id="config-label")
-                yield Select(
-                    self.get_predict_configs(),
-                    id="config-select"
-                )
+                yield Select([], id="config-select")
 
             with Horizontal(id="control-row"):
                 yield Button("Start Prediction", id="predict-button", variant="primary")
@@ -42,16 +82,33 @@ class SpertPredictorScreen(Screen):
                 
             yield RichLog(id="output-log", wrap=True)
 
-    def on_mount(self) -> None:
+    async def on_mount(self) -> None:
         """Initialize screen"""
         self.prediction_process = None
+        self.prediction_worker = None
         self.stop_button = self.query_one("#stop-button", Button)
         self.stop_button.disabled = True
+        self._start_log_flusher(self.query_one("#output-log", RichLog))
+        
+        # Scan both directories at the same time
+        input_files, predict_configs = await asyncio.gather(
+            asyncio.to_thread(self.get_preprocessed_files),
+            asyncio.to_thread(self.get_predict_configs)
+        )
+        self.query_one("#input-select", Select).set_options(input_files)
+        self.query_one("#config-select", Select).set_options(predict_configs)
+
+    def _ensure_dir(self, path: Path) -> None:
+        """Create a directory once per session"""
+        key = str(path)
+        if key in self._ensured_dirs:
+            return
+        path.mkdir(exist_ok=True, parents=True)
+        self._ensured_dirs.add(key)
 
     def get_preprocessed_files(self):
         """Get list of files from app/data/preprocessed/ directory"""
-        app_dir = Path(__file__).parent.parent
-        preprocessed_dir = app_dir / "data" / "preprocessed"
+        preprocessed_dir = _APP_DIR / "data" / "preprocessed"
         
         files = []
         
@@ -74,23 +131,24 @@ class SpertPredictorScreen(Screen):
 
     def get_predict_configs(self):
         """Return list of prediction config files"""
-        spert_dir = Path(__file__).parent.parent.parent / "spert"
-        config_dir = spert_dir / "configs"
-        if not config_dir.exists():
+        try:
+            with os.scandir(_SPERT_DIR / "configs") as it:
+                # Filter for prediction configs
+                predict_configs = [(e.name, e.name) for e in it
+                                   if e.is_file() and e.name.endswith(".conf") and "predict" in e.name]
+        except FileNotFoundError:
             return [("No configs found", "")]
         
-        # Filter for prediction configs
-        predict_configs = [f for f in config_dir.glob("*predict*.conf")]
         if not predict_configs:
             return [("No prediction configs found", "")]
         
-        return [(f.name, f.name) for f in predict_configs]
+        return predict_configs
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "prepare-button":
             self.prepare_data()
         elif event.button.id == "predict-button":
-            self.start_prediction()
+            self.prediction_worker = self.start_prediction()
         elif event.button.id == "stop-button":
             self.stop_prediction()
         elif event.button.id == "back-button":
@@ -99,11 +157,6 @@ class SpertPredictorScreen(Screen):
     @work(thread=True)
     def prepare_data(self) -> None:
         """Prepare data for prediction by tokenizing selected text file"""
-        root_dir = Path(__file__).parent.parent.parent
-        tokenizer_script = root_dir / "app" / "utils" / "tokenize_samples.py"
-        venv_path = root_dir / ".venv"
-        python_path = venv_path / "bin" / "python"
-        
         log = self.query_one("#output-log")
         
         try:
@@ -118,55 +171,33 @@ class SpertPredictorScreen(Screen):
                 return
             
             log.write("Preparing data for prediction...\n")
-            log.write(f"Input file: {input_file}\n")
-            log.write(f"Tokenizing with: {tokenizer_script}\n\n")
+            log.write(f"Input file: {input_file}\n\n")
             
-            # Prepare the command to run tokenize_samples.py - save to sentences_to_predict directory
-            sentences_dir = root_dir / "spert" / "data" / "sentences_to_predict"
-            sentences_dir.mkdir(exist_ok=True, parents=True)
-            output_path = sentences_dir / "raw_text.json"
-            cmd = [
-                str(python_path),
-                str(tokenizer_script),
-                "--input", input_file,
-                "--output", str(output_path)
-            ]
+            # Tokenize in this process; spaCy is imported on first use only
+            from utils.tokenize_samples import tokenize_text_file
             
-            # Run the tokenizer
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                cwd=str(root_dir)
-            )
+            output_path = _SPERT_DIR / "data" / "sentences_to_predict" / "raw_text.json"
+            num_sentences = tokenize_text_file(input_file, str(output_path))
             
-            if result.returncode == 0:
-                log.write("Data preparation completed successfully!\n")
-                log.write(result.stdout + "\n")
-                log.write(f"Output saved to: {output_path}\n\n")
-                log.write("You can now start prediction.\n")
-            else:
-                log.write("Error during data preparation:\n")
-                log.write(result.stderr + "\n")
+            log.write("Data preparation completed successfully!\n")
+            log.write(f"Successfully tokenized {num_sentences} sentences\n")
+            log.write(f"Output saved to: {output_path}\n\n")
+            log.write("You can now start prediction.\n")
             
         except Exception as e:
             log.write(f"Error: {str(e)}\n")
 
-    @work(thread=True)
-    def start_prediction(self) -> None:
-        spert_dir = Path(__file__).parent.parent.parent / "spert"
-        venv_path = spert_dir / ".spert_env"
-        python_path = venv_path / "bin" / "python"
-        
+    @work(exclusive=True, group="prediction")
+    async def start_prediction(self) -> None:
         log = self.query_one("#output-log")
         
         try:
-            if not python_path.exists():
-                log.write(f"Error: SpERT virtual environment not found at {venv_path}\n")
+            if not _SPERT_VENV_PY.exists():
+                log.write(f"Error: SpERT virtual environment not found at {_SPERT_VENV}\n")
                 return
             
             # Check if raw_text.json exists in sentences_to_predict directory
-            raw_text_path = spert_dir / "data" / "sentences_to_predict" / "raw_text.json"
+            raw_text_path = _SPERT_DIR / "data" / "sentences_to_predict" / "raw_text.json"
             if not raw_text_path.exists():
                 log.write("Error: No prepared data found!\n")
                 log.write("Please use 'Prepare Data' first to select and tokenize a text file.\n")
@@ -178,45 +209,42 @@ class SpertPredictorScreen(Screen):
                 return
             
             # Create custom config with model_predictions output path
-            model_predictions_dir = spert_dir / "data" / "model_predictions"
-            model_predictions_dir.mkdir(exist_ok=True, parents=True)
+            self._ensure_dir(_SPERT_DIR / "data" / "model_predictions")
             
             # Read the original config
-            original_config_path = spert_dir / "configs" / config_file
-            with open(original_config_path, 'r') as f:
-                config_content = f.read()
+            original_config_path = _SPERT_DIR / "configs" / config_file
+            config_content = original_config_path.read_text(encoding="utf-8")
             
-            # Modify the dataset path to point to sentences_to_predict/raw_text.json
+            # Point the dataset and predictions paths at sentences_to_predict/ and model_predictions/
             dataset_path = "data/sentences_to_predict/raw_text.json"
-            config_content = re.sub(
-                r'dataset_path\s*=\s*.*',
-                f'dataset_path = {dataset_path}',
-                config_content
-            )
-            
-            # Modify the predictions path to point to model_predictions/predictions.json
             predictions_path = "data/model_predictions/predictions.json"
-            config_content = re.sub(
-                r'predictions_path\s*=\s*.*',
-                f'predictions_path = {predictions_path}',
-                config_content
-            )
-            
-            # Create temporary config file
-            temp_config_path = spert_dir / f"temp_{config_file}"
-            with open(temp_config_path, 'w') as f:
-                f.write(config_content)
+            runs = read_config_runs(config_content)
+            if len(runs) != 1 or runs[0][0] != 1:
+                # Flags describe a single run, so a config with several (or repeated) runs goes to SpERT as is
+                log.write("Note: config has several runs, using its own dataset and predictions paths\n")
+                config_args = ["--config", f"configs/{config_file}"]
+            elif (runs[0][1].get("dataset_path") == dataset_path
+                    and runs[0][1].get("predictions_path") == predictions_path):
+                # The config already points at the right files, use it as is
+                config_args = ["--config", f"configs/{config_file}"]
+            else:
+                config = dict(runs[0][1])
+                config["dataset_path"] = dataset_path
+                config["predictions_path"] = predictions_path
+                # SpERT lets a --config file override command-line flags, so pass the
+                # whole config as flags instead of writing a modified copy to disk
+                config_args = config_to_args(config)
             
             cmd = [
-                str(python_path),
+                str(_SPERT_VENV_PY),
                 "spert.py",
                 "predict",
-                "--config", str(temp_config_path.name)
+                *config_args
             ]
             
             log.write("Starting SpERT prediction...\n")
-            log.write(f"Using Python from: {python_path}\n")
-            log.write(f"Working directory: {spert_dir}\n")
+            log.write(f"Using Python from: {_SPERT_VENV_PY}\n")
+            log.write(f"Working directory: {_SPERT_DIR}\n")
             log.write(f"Config file: {config_file}\n")
             log.write(f"Input data: {raw_text_path}\n")
             log.write(f"Output will be saved to: spert/data/model_predictions/predictions.json\n\n")
@@ -224,46 +252,47 @@ class SpertPredictorScreen(Screen):
             self.query_one("#predict-button", Button).disabled = True
             self.stop_button.disabled = False
             
-            self.prediction_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=str(spert_dir)
+            self.prediction_process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(_SPERT_DIR),
+                start_new_session=True
             )
             
-            while True:
-                output = self.prediction_process.stdout.readline()
-                if output == '' and self.prediction_process.poll() is not None:
-                    break
-                if output:
-                    log.write(output.strip() + "\n")
-            
-            returncode = self.prediction_process.poll()
+            returncode = await stream_output(self.prediction_process, self._queue_log)
+            self._flush_log()
             if returncode != 0:
-                error = self.prediction_process.stderr.read()
-                log.write(f"Error: {error}\n")
+                log.write(f"Error: process exited with code {returncode} - see log above\n")
             else:
                 log.write("Prediction completed successfully!\n")
                 log.write(f"Results saved to: spert/data/model_predictions/predictions.json\n")
                 log.write("Entity search can now access the predictions.\n")
             
-            # Cleanup temporary config file
-            if temp_config_path.exists():
-                temp_config_path.unlink()
-            
             self.query_one("#predict-button", Button).disabled = False
             self.stop_button.disabled = True
             
         except Exception as e:
+            # Buffered process output goes out before the error line
+            self._flush_log()
             log.write(f"Error: {str(e)}\n")
             self.query_one("#predict-button", Button).disabled = False
             self.stop_button.disabled = True
 
-    def stop_prediction(self) -> None:
+    @work(exclusive=True, group="stop")
+    async def stop_prediction(self) -> None:
         if self.prediction_process:
-            self.prediction_process.terminate()
-            self.prediction_process = None
+            process, self.prediction_process = self.prediction_process, None
+            self.stop_button.disabled = True
+            
+            worker = self.prediction_worker
+            if worker:
+                worker.cancel()
+            await stop_process_group(process)
+            if worker:
+                # Don't allow a new run until the old worker has fully finished
+                with suppress(WorkerError):
+                    await worker.wait()
             
             self.query_one("#predict-button", Button).disabled = False
             self.stop_button.disabled = True
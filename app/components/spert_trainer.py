@@ -3,12 +3,24 @@ from textual.containers import Vertical, Horizontal
 from textual.widgets import Button, Input, Label, Select, RichLog
 from textual.screen import Screen
 from textual import work
-import re
+from textual.worker import WorkerError
+import asyncio
+from contextlib import suppress
+import os
 from pathlib import Path
-import subprocess
 from typing import Dict, Any
+from utils.process_output import stream_output, stop_process_group
+from utils.log_flusher import LogFlusher
 
-class SpertTrainerScreen(Screen):
+_APP_DIR = Path(__file__).resolve().parent.parent
+_ROOT_DIR = _APP_DIR.parent
+_SPERT_DIR = _ROOT_DIR / "spert"
+_SPERT_VENV = _SPERT_DIR / ".spert_env"
+_SPERT_VENV_PY = _SPERT_VENV / "bin" / "python"
+_APP_VENV = _ROOT_DIR / ".venv"
+_APP_VENV_PY = _APP_VENV / "bin" / "python"
+
+class SpertTrainerScreen(LogFlusher, Screen):
     """SpERT model training interface"""
 
     def compose(self) -> ComposeResult:
@@ -18,19 +30,13 @@ class SpertTrainerScreen(Screen):
             yield Label("Data Preparation", id="data-prep-title")
             with Horizontal(id="data-prep-row"):
                 yield Label("CSV File:", id="csv-label")
-                yield Select(
-                    self.get_csv_files(),
-                    id="csv-select"
-                )
+                yield Select([], id="csv-select")
                 yield Button("Prepare Data", id="prepare-button", variant="success")
 
             yield Label("Training Configuration", id="training-config-title")
             with Horizontal(id="params-row"):
                 yield Label("Config:", id="config-label")
-                yield Select(
-                    self.get_config_files(),
-                    id="config-select"
-                )
+                yield Select([], id="config-select")
 
             with Horizontal(id="control-row"):
                 yield Button("Start Training", id="train-button", variant="primary")
@@ -39,39 +45,48 @@ class SpertTrainerScreen(Screen):
                 
             yield RichLog(id="output-log", wrap=True)
 
-    def on_mount(self) -> None:
+    async def on_mount(self) -> None:
         self.training_process = None
+        self.training_worker = None
         self.stop_button = self.query_one("#stop-button", Button)
         self.stop_button.disabled = True
+        self._start_log_flusher(self.query_one("#output-log", RichLog))
+        
+        # Scan both directories at the same time
+        csv_files, config_files = await asyncio.gather(
+            asyncio.to_thread(self.get_csv_files),
+            asyncio.to_thread(self.get_config_files)
+        )
+        self.query_one("#csv-select", Select).set_options(csv_files)
+        self.query_one("#config-select", Select).set_options(config_files)
 
     def get_csv_files(self):
         """Get list of CSV files from app/data/annotated_csv_data/"""
-        csv_data_dir = Path(__file__).parent.parent / "data" / "annotated_csv_data"
-        if not csv_data_dir.exists():
+        try:
+            with os.scandir(_APP_DIR / "data" / "annotated_csv_data") as it:
+                csv_files = [(e.name, e.name) for e in it
+                             if e.is_file() and e.name.endswith(".csv")]
+        except FileNotFoundError:
             return [("No CSV files found", "")]
         
-        csv_files = list(csv_data_dir.glob("*.csv"))
         if not csv_files:
             return [("No CSV files found", "")]
         
-        return [(f.name, f.name) for f in csv_files]
+        return csv_files
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "prepare-button":
             self.prepare_data()
         elif event.button.id == "train-button":
-            self.start_training()
+            self.training_worker = self.start_training()
         elif event.button.id == "stop-button":
             self.stop_training()
         elif event.button.id == "back-button":
             self.app.pop_screen()
 
-    @work(thread=True)
-    def prepare_data(self) -> None:
-        root_dir = Path(__file__).parent.parent.parent
-        csv_to_spert_path = root_dir / "app" / "utils" / "csv_to_spert.py"
-        venv_path = root_dir / ".venv"
-        python_path = venv_path / "bin" / "python"
+    @work(exclusive=True, group="prepare")
+    async def prepare_data(self) -> None:
+        csv_to_spert_path = _APP_DIR / "utils" / "csv_to_spert.py"
         
         log = self.query_one("#output-log")
         
@@ -83,7 +98,7 @@ class SpertTrainerScreen(Screen):
                 return
 
             # Build full path to CSV file in app/data/annotated_csv_data/
-            csv_path = root_dir / "app" / "data" / "annotated_csv_data" / csv_file
+            csv_path = _APP_DIR / "data" / "annotated_csv_data" / csv_file
             if not csv_path.exists():
                 log.write(f"Error: CSV file not found: {csv_path}\n")
                 return
@@ -92,45 +107,38 @@ class SpertTrainerScreen(Screen):
                 log.write(f"Error: csv_to_spert.py not found at {csv_to_spert_path}\n")
                 return
             
-            if not python_path.exists():
-                log.write(f"Error: Virtual environment not found at {venv_path}\n")
+            if not _APP_VENV_PY.exists():
+                log.write(f"Error: Virtual environment not found at {_APP_VENV}\n")
                 return
             
             log.write("Starting data preparation...\n")
             log.write(f"Using CSV file: {csv_file}\n")
-            log.write(f"Using Python from: {python_path}\n")
-            log.write(f"Working directory: {root_dir}\n\n")
+            log.write(f"Using Python from: {_APP_VENV_PY}\n")
+            log.write(f"Working directory: {_ROOT_DIR}\n\n")
             
             # Disable button during processing
             self.query_one("#prepare-button", Button).disabled = True
             
             # Execute the data preparation script with command line arguments
-            spert_data_dir = root_dir / "spert" / "data"
-            cmd = [str(python_path), str(csv_to_spert_path), str(csv_path), str(spert_data_dir)]
+            spert_data_dir = _SPERT_DIR / "data"
+            cmd = [str(_APP_VENV_PY), str(csv_to_spert_path), "--csv", str(csv_path), "--out-dir", str(spert_data_dir)]
             
             log.write(f"Running command: {' '.join(cmd)}\n\n")
             
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=str(root_dir)
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(_ROOT_DIR)
             )
             
             # Stream output
-            while True:
-                output = process.stdout.readline()
-                if output == '' and process.poll() is not None:
-                    break
-                if output:
-                    log.write(output.strip() + "\n")
+            returncode = await stream_output(process, self._queue_log)
+            self._flush_log()
             
             # Check for errors
-            returncode = process.poll()
             if returncode != 0:
-                error = process.stderr.read()
-                log.write(f"Error: {error}\n")
+                log.write(f"Error: process exited with code {returncode} - see log above\n")
             else:
                 log.write("\nData preparation completed successfully!\n")
                 log.write("Generated files:\n")
@@ -143,23 +151,20 @@ class SpertTrainerScreen(Screen):
             self.query_one("#prepare-button", Button).disabled = False
             
         except Exception as e:
+            # Buffered process output goes out before the error line
+            self._flush_log()
             log.write(f"Error: {str(e)}\n")
             # Re-enable button on error
             self.query_one("#prepare-button", Button).disabled = False
 
-    @work(thread=True)
-    def start_training(self) -> None:
+    @work(exclusive=True, group="training")
+    async def start_training(self) -> None:
         """Start SpERT training using the SpERT virtual environment"""
-        # Get paths
-        spert_dir = Path(__file__).parent.parent.parent / "spert"
-        venv_path = spert_dir / ".spert_env"
-        python_path = venv_path / "bin" / "python"
-        
         log = self.query_one("#output-log")
         
         try:
-            if not python_path.exists():
-                log.write(f"Error: SpERT virtual environment not found at {venv_path}\n")
+            if not _SPERT_VENV_PY.exists():
+                log.write(f"Error: SpERT virtual environment not found at {_SPERT_VENV}\n")
                 return
             
             # Get selected config
@@ -167,15 +172,15 @@ class SpertTrainerScreen(Screen):
             
             # Prepare the command
             cmd = [
-                str(python_path),
+                str(_SPERT_VENV_PY),
                 "spert.py",
                 "train",
                 "--config", f"configs/{config_file}"
             ]
             
             log.write("Starting SpERT training...\n")
-            log.write(f"Using Python from: {python_path}\n")
-            log.write(f"Working directory: {spert_dir}\n")
+            log.write(f"Using Python from: {_SPERT_VENV_PY}\n")
+            log.write(f"Working directory: {_SPERT_DIR}\n")
             log.write(f"Config file: {config_file}\n\n")
             
             # Update UI state
@@ -183,27 +188,21 @@ class SpertTrainerScreen(Screen):
             self.stop_button.disabled = False
             
             # Execute training
-            self.training_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=str(spert_dir)
+            self.training_process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(_SPERT_DIR),
+                start_new_session=True
             )
             
             # Stream output
-            while True:
-                output = self.training_process.stdout.readline()
-                if output == '' and self.training_process.poll() is not None:
-                    break
-                if output:
-                    log.write(output.strip() + "\n")
+            returncode = await stream_output(self.training_process, self._queue_log)
+            self._flush_log()
             
             # Check for errors
-            returncode = self.training_process.poll()
             if returncode != 0:
-                error = self.training_process.stderr.read()
-                log.write(f"Error: {error}\n")
+                log.write(f"Error: process exited with code {returncode} - see log above\n")
             else:
                 log.write("Training completed successfully!\n")
             
@@ -212,6 +211,8 @@ class SpertTrainerScreen(Screen):
             self.stop_button.disabled = True
             
         except Exception as e:
+            # Buffered process output goes out before the error line
+            self._flush_log()
             log.write(f"Error: {str(e)}\n")
             # Reset UI state on error
             self.query_one("#train-button", Button).disabled = False
@@ -225,23 +226,34 @@ class SpertTrainerScreen(Screen):
 
     def get_config_files(self):
         """Return list of training config files"""
-        spert_dir = Path(__file__).parent.parent.parent / "spert"
-        config_dir = spert_dir / "configs"
-        if not config_dir.exists():
+        try:
+            with os.scandir(_SPERT_DIR / "configs") as it:
+                # Filter for training configs
+                train_configs = [(e.name, e.name) for e in it
+                                 if e.is_file() and e.name.endswith(".conf") and "train" in e.name]
+        except FileNotFoundError:
             return [("No configs found", "")]
         
-        # Filter for training configs
-        train_configs = [f for f in config_dir.glob("*train*.conf")]
         if not train_configs:
             return [("No training configs found", "")]
         
-        return [(f.name, f.name) for f in train_configs]
+        return train_configs
 
-    def stop_training(self) -> None:
-        """Stop training process"""
+    @work(exclusive=True, group="stop")
+    async def stop_training(self) -> None:
+        """Stop training process and any workers it spawned"""
         if self.training_process:
-            self.training_process.terminate()
-            self.training_process = None
+            process, self.training_process = self.training_process, None
+            self.stop_button.disabled = True
+            
+            worker = self.training_worker
+            if worker:
+                worker.cancel()
+            await stop_process_group(process)
+            if worker:
+                # Don't allow a new run until the old worker has fully finished
+                with suppress(WorkerError):
+                    await worker.wait()
             
             # Update UI state
             self.query_one("#train-button", Button).disabled = False
@@ -3,14 +3,66 @@ from textual.containers import Vertical, Horizontal, VerticalScroll
 from textual.widgets import Button, Input, Label, Select, Markdown, TextArea, Checkbox, Footer
 from textual.screen import Screen
 from textual.binding import Binding
-from textual import events
+from textual import events, work
 from pathlib import Path
 import re
 import json
-from typing import List, Tuple
-from utils.clean_text import preprocess_stream
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Iterable, Iterator
+from itertools import chain
+from utils.clean_text import preprocess_to_string
 from components.processing_preview_screen import ProcessingPreviewScreen
-import tempfile
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+_SENT_RE = re.compile(r'[.!?]+\s+')
+
+
+def _chapter_alternatives(word: str) -> str:
+    return f'{re.escape(word)}|{re.escape(word.lower())}|{re.escape(word.capitalize())}'
+
+
+@lru_cache(maxsize=32)
+def _chapter_re(word: str) -> re.Pattern:
+    """Heading line pattern for a chapter word, e.g. CHAPTER I, Chapter 1, BOOK II"""
+    return re.compile(rf'\n\s*({_chapter_alternatives(word)})\s+[IVXLC\d]+.*?\n')
+
+
+@lru_cache(maxsize=32)
+def _chapter_token_re(word: str) -> re.Pattern:
+    """Pattern for a bare chapter word left behind by the heading split"""
+    return re.compile(rf'^({_chapter_alternatives(word)})$', re.IGNORECASE)
+
+
+def _line_range_slice(text: str, start: int, end: int) -> str:
+    """Return lines start..end (1-based, inclusive) of text by slicing between newlines"""
+    if start < 1 or end < 0:
+        return '\n'.join(text.split('\n')[start-1:end])
+    if end < start:
+        return ''
+    if start == 1 and end > text.count('\n'):
+        # The whole text is selected
+        return text
+    
+    pos = 0
+    for _ in range(start - 1):
+        nl = text.find('\n', pos)
+        if nl == -1:
+            return ''
+        pos = nl + 1
+    begin = pos
+    
+    for _ in range(end - start + 1):
+        nl = text.find('\n', pos)
+        if nl == -1:
+            return text[begin:]
+        pos = nl + 1
+    return text[begin:pos - 1]
 
 
 class TextPreprocessorScreen(Screen):
@@ -86,6 +138,11 @@ class TextPreprocessorScreen(Screen):
     def on_mount(self) -> None:
         """Initialize screen"""
         self.current_text = ""
+        self._current_path = None
+        self._line_count = 0
+        # Full texts already read, keyed by path, so toggling cleaning doesn't reload the file
+        self._raw_cache = {}
+        self._cleaned_cache = {}
         self.processed_chunks = []
         self._mounted = True
         # Add debug timing to see layout after everything is rendered
@@ -204,6 +261,7 @@ class TextPreprocessorScreen(Screen):
                 self.load_text_file(Path(event.value))
             else:
                 # No file selected or back to placeholder - clear preview
+                self._current_path = None
                 self.current_text = ""
                 self.query_one("#text-preview", TextArea).text = "Select a file to see preview..."
                 self.query_one("#end-input", Input).value = "auto"
@@ -231,55 +289,77 @@ class TextPreprocessorScreen(Screen):
                 self.query_one("#text-preview", TextArea).text = "Error: File not found"
                 return
                 
+            # Switch the path before the text; _ensure_full_text relies on that order
+            self._current_path = file_path
+            
             # Check if Gutenberg cleaning should be applied
             should_clean = self.query_one("#clean-gutenberg", Checkbox).value if hasattr(self, '_mounted') else True
             
             if should_clean and self.is_gutenberg_file(file_path):
-                # Apply Gutenberg cleaning to a temporary file
-                with tempfile.NamedTemporaryFile(mode='w+', suffix='.txt', delete=False) as temp_file:
-                    temp_path = temp_file.name
-                
-                try:
-                    preprocess_stream(str(file_path), temp_path)
-                    with open(temp_path, 'r', encoding='utf-8') as f:
-                        self.current_text = f.read()
-                finally:
-                    # Clean up temp file
-                    Path(temp_path).unlink(missing_ok=True)
+                # Apply Gutenberg cleaning in memory
+                if file_path not in self._cleaned_cache:
+                    self._cleaned_cache[file_path] = preprocess_to_string(str(file_path))
+                self.current_text = self._cleaned_cache[file_path]
+            elif file_path in self._raw_cache:
+                self.current_text = self._raw_cache[file_path]
             else:
-                # Load file as-is
+                # Only read what the preview needs; the full text is loaded on first use
+                self.current_text = None
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    self.current_text = f.read()
+                    head = f.read(4096)
+                self._line_count = self.count_lines(file_path)
+            
+            if self.current_text is not None:
+                head = self.current_text[:4096]
+                self._line_count = self.current_text.count('\n') + 1
             
             # Show preview (first 2000 characters)
-            preview_text = self.current_text[:2000]
-            if len(self.current_text) > 2000:
+            preview_text = head[:2000]
+            if len(head) > 2000:
                 preview_text += "\n\n... [File continues] ..."
             
             self.query_one("#text-preview", TextArea).text = preview_text
             
             # Show text info
-            lines = self.current_text.split('\n')
-            self.query_one("#end-input", Input).value = str(len(lines))
+            self.query_one("#end-input", Input).value = str(self._line_count)
             
         except Exception as e:
             self.current_text = ""
             self.query_one("#text-preview", TextArea).text = f"Error loading file: {str(e)}"
             self.query_one("#end-input", Input).value = "auto"
 
+    def count_lines(self, file_path: Path) -> int:
+        """Count lines by scanning the file in binary chunks"""
+        with open(file_path, 'rb') as f:
+            return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b'')) + 1
+
+    def _ensure_full_text(self) -> str:
+        """Return the selected file's text, reading it on first use"""
+        # Runs in worker threads: stick to the path selected now, even if the user picks another file meanwhile
+        path = self._current_path
+        text = self.current_text
+        if text is None:
+            with open(path, 'r', encoding='utf-8', buffering=1 << 20) as f:
+                text = f.read()
+            self._raw_cache[path] = text
+            if self._current_path is path:
+                self.current_text = text
+        return text
+
     def is_gutenberg_file(self, file_path: Path) -> bool:
         """Check if file appears to be a Project Gutenberg ebook"""
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                # Check first few lines for Gutenberg markers
-                first_lines = ''.join(f.readlines()[:50])
-                return "PROJECT GUTENBERG" in first_lines.upper()
+                # The Gutenberg banner sits in the header, so the first 8 KiB is enough
+                head = f.read(8192)
+                return "PROJECT GUTENBERG" in head.upper()
         except:
             return False
 
+    @work(exclusive=True, thread=True, group="preview")
     def preview_processing(self) -> None:
         """Preview how the text will be processed"""
-        if not self.current_text:
+        if not self._ensure_full_text():
             # Show a message if no file is selected
             preview_data = {
                 "cleaned_status": "No file selected",
@@ -287,10 +367,10 @@ class TextPreprocessorScreen(Screen):
                 "chapter_word": "N/A",
                 "output_format": "N/A"
             }
-            self.app.push_screen(ProcessingPreviewScreen(preview_data, ["Please select a file first"]))
+            self.app.call_from_thread(self.app.push_screen, ProcessingPreviewScreen(preview_data, ["Please select a file first"]))
             return
         
-        chunks = self.process_text(preview_only=True)
+        chunks = list(self.process_text(preview_only=True))
         
         # Prepare preview data
         cleaned_status = "✓ Applied" if self.query_one("#clean-gutenberg", Checkbox).value else "✗ Skipped"
@@ -306,23 +386,22 @@ class TextPreprocessorScreen(Screen):
         }
         
         # Open preview in new screen
-        self.app.push_screen(ProcessingPreviewScreen(preview_data, chunks))
+        self.app.call_from_thread(self.app.push_screen, ProcessingPreviewScreen(preview_data, chunks))
 
-    def process_text(self, preview_only: bool = False) -> List[str]:
+    def process_text(self, preview_only: bool = False) -> Iterable[str]:
         """Process text according to user settings"""
-        if not self.current_text:
+        text = self._ensure_full_text()
+        if not text:
             return []
         
         # Get boundaries
         start_line = int(self.query_one("#start-input", Input).value or "1")
         end_input = self.query_one("#end-input", Input).value
         
-        lines = self.current_text.split('\n')
-        end_line = len(lines) if end_input == "auto" or not end_input else int(end_input)
+        end_line = self._line_count if end_input in ("auto", "") else int(end_input)
         
         # Extract selected portion
-        selected_lines = lines[start_line-1:end_line]
-        text_portion = '\n'.join(selected_lines)
+        text_portion = _line_range_slice(text, start_line, end_line)
         
         # Get split method
         split_method = self.query_one("#split-select", Select).value
@@ -343,58 +422,62 @@ class TextPreprocessorScreen(Screen):
 
     def split_by_sentences(self, text: str, max_size: int) -> List[str]:
         """Split text by sentences, respecting max size"""
-        sentences = re.split(r'[.!?]+\s+', text)
+        sentences = _SENT_RE.split(text)
         return self.group_by_size(sentences, max_size)
 
     def split_by_paragraphs(self, text: str, max_size: int) -> List[str]:
         """Split text by paragraphs, respecting max size"""
         # Try double newlines first, then fall back to single newlines for better paragraph detection
         if '\n\n' in text:
-            paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+            sep, min_len = '\n\n', 1
         else:
             # For texts with single newlines, split on single newlines but filter out very short lines
-            paragraphs = [p.strip() for p in text.split('\n') if p.strip() and len(p.strip()) > 10]
+            sep, min_len = '\n', 11
+        paragraphs = [p for p in (part.strip() for part in text.split(sep)) if len(p) >= min_len]
         return self.group_by_size(paragraphs, max_size)
 
     def split_by_chapters(self, text: str, max_size: int, chapter_word: str = "CHAPTER") -> List[str]:
         """Split text by chapters/books using custom chapter word"""
-        # Create flexible pattern that matches various formats:
-        # CHAPTER I, Chapter 1, BOOK I, Book II, etc.
-        chapter_pattern = rf'\n\s*({re.escape(chapter_word)}|{re.escape(chapter_word.lower())}|{re.escape(chapter_word.capitalize())})\s+[IVXLC\d]+.*?\n'
-        chapters = re.split(chapter_pattern, text)
-        chapters = [c.strip() for c in chapters if c.strip() and not re.match(rf'^({re.escape(chapter_word)}|{re.escape(chapter_word.lower())}|{re.escape(chapter_word.capitalize())})$', c.strip(), re.IGNORECASE)]
+        chapters = _chapter_re(chapter_word).split(text)
+        token_re = _chapter_token_re(chapter_word)
+        chapters = [c.strip() for c in chapters if c.strip() and not token_re.match(c.strip())]
         return self.group_by_size(chapters, max_size)
 
-    def split_by_size(self, text: str, max_size: int) -> List[str]:
-        """Split text by character count"""
-        chunks = []
+    def split_by_size(self, text: str, max_size: int) -> Iterator[str]:
+        """Split text by character count, yielding chunks lazily"""
         for i in range(0, len(text), max_size):
-            chunks.append(text[i:i+max_size])
-        return chunks
+            yield text[i:i+max_size]
 
     def group_by_size(self, items: List[str], max_size: int) -> List[str]:
         """Group items together until reaching max_size"""
         chunks = []
-        current_chunk = ""
+        buf = []
+        buf_len = 0
         
         for item in items:
-            if len(current_chunk) + len(item) + 1 <= max_size:
-                current_chunk += " " + item if current_chunk else item
+            if buf_len + len(item) + 1 <= max_size:
+                buf.append(item)
+                buf_len += len(item) + 1 if buf_len else len(item)
             else:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = item
+                if buf_len:
+                    chunks.append(" ".join(buf).strip())
+                buf = [item]
+                buf_len = len(item)
         
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+        if buf_len:
+            chunks.append(" ".join(buf).strip())
         
         return chunks
 
+    @work(exclusive=True, thread=True, group="save")
     def process_and_save(self) -> None:
         """Process text and save to preprocessed data folder"""
-        chunks = self.process_text()
-        if not chunks:
+        # Chunks may be a generator, so peek at the first one to detect empty output
+        chunks = iter(self.process_text())
+        first = next(chunks, None)
+        if first is None:
             return
+        chunks = chain([first], chunks)
         
         # Save processed chunks
         output_dir = Path(__file__).parent.parent / "data" / "preprocessed"
@@ -415,62 +498,73 @@ class TextPreprocessorScreen(Screen):
         else:  # plain
             self.save_as_plain_text(chunks, output_dir, original_name)
 
-    def save_as_plain_text(self, chunks: List[str], output_dir: Path, original_name: str) -> None:
+    def save_as_plain_text(self, chunks: Iterable[str], output_dir: Path, original_name: str) -> None:
         """Save chunks as plain text with separators"""
         output_file = output_dir / f"{original_name}_preprocessed.txt"
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for i, chunk in enumerate(chunks):
-                f.write(f"=== CHUNK {i+1} ===\n")
-                f.write(chunk)
-                f.write(f"\n\n")
+        parts = []
+        for i, chunk in enumerate(chunks):
+            parts.append(f"=== CHUNK {i+1} ===\n")
+            parts.append(chunk)
+            parts.append("\n\n")
+        
+        with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+            f.write("".join(parts))
         
-        self.show_success_message(output_file.name, len(chunks), f"Single file: {output_file}")
+        self.show_success_message(output_file.name, len(parts) // 3, f"Single file: {output_file}")
 
-    def save_as_json(self, chunks: List[str], output_dir: Path, original_name: str) -> None:
+    def save_as_json(self, chunks: Iterable[str], output_dir: Path, original_name: str) -> None:
         """Save chunks as JSON array"""
         output_file = output_dir / f"{original_name}_preprocessed.json"
         
+        chunk_entries = [
+            {
+                "id": i + 1,
+                "content": chunk,
+                "length": len(chunk)
+            } for i, chunk in enumerate(chunks)
+        ]
         chunk_data = {
             "metadata": {
                 "original_file": original_name,
-                "total_chunks": len(chunks),
+                "total_chunks": len(chunk_entries),
                 "processing_options": self.get_processing_metadata()
             },
-            "chunks": [
-                {
-                    "id": i + 1,
-                    "content": chunk,
-                    "length": len(chunk)
-                } for i, chunk in enumerate(chunks)
-            ]
+            "chunks": chunk_entries
         }
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(chunk_data, f, indent=2, ensure_ascii=False)
+        if ORJSON_AVAILABLE:
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(chunk_data, option=orjson.OPT_INDENT_2))
+        else:
+            # json.dump issues many small writes, so give it a large buffer
+            with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                json.dump(chunk_data, f, indent=2, ensure_ascii=False)
         
-        self.show_success_message(output_file.name, len(chunks), f"JSON file: {output_file}")
+        self.show_success_message(output_file.name, len(chunk_entries), f"JSON file: {output_file}")
 
-    def save_as_separate_files(self, chunks: List[str], output_dir: Path, original_name: str) -> None:
+    def save_as_separate_files(self, chunks: Iterable[str], output_dir: Path, original_name: str) -> None:
         """Save each chunk as a separate file"""
         chunk_dir = output_dir / f"{original_name}_chunks"
         chunk_dir.mkdir(exist_ok=True)
         
-        for i, chunk in enumerate(chunks):
-            chunk_file = chunk_dir / f"chunk_{i+1:03d}.txt"
-            with open(chunk_file, 'w', encoding='utf-8') as f:
-                f.write(chunk)
+        # Many small files: overlap the open/write/close round-trips
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            chunk_count = len(list(executor.map(
+                lambda item: (chunk_dir / f"chunk_{item[0]+1:03d}.txt").write_text(item[1], encoding='utf-8'),
+                enumerate(chunks)
+            )))
         
         # Also create a metadata file
         metadata_file = chunk_dir / "metadata.txt"
         with open(metadata_file, 'w', encoding='utf-8') as f:
             f.write(f"Original file: {original_name}\n")
-            f.write(f"Total chunks: {len(chunks)}\n")
+            f.write(f"Total chunks: {chunk_count}\n")
             f.write(f"Processing options:\n")
             for key, value in self.get_processing_metadata().items():
                 f.write(f"  {key}: {value}\n")
         
-        self.show_success_message(f"{len(chunks)} files", len(chunks), f"Directory: {chunk_dir}")
+        self.show_success_message(f"{chunk_count} files", chunk_count, f"Directory: {chunk_dir}")
 
     def get_processing_metadata(self) -> dict:
         """Get current processing options as metadata"""
@@ -488,7 +582,8 @@ class TextPreprocessorScreen(Screen):
         cleaned_status = "with Gutenberg cleaning" if self.query_one("#clean-gutenberg", Checkbox).value else "without cleaning"
         
         # Show success notification with key info
-        self.notify(
+        self.app.call_from_thread(
+            self.notify,
             f"✅ Processing Complete! {file_info} - {chunk_count} chunks created {cleaned_status}",
             title="Text Processing Success",
             severity="information",
@@ -496,7 +591,8 @@ class TextPreprocessorScreen(Screen):
         )
         
         # Show location info in a separate notification
-        self.notify(
+        self.app.call_from_thread(
+            self.notify,
             f"📁 Saved to: {location}",
             title="Output Location", 
             severity="information",
@@ -1,88 +1,139 @@
-from dataclasses import dataclass
-from typing import List, Dict, Set
+from dataclasses import dataclass, field
+from typing import List, Dict, Set, Tuple, Optional
 from pathlib import Path
+from collections import defaultdict
 import json
+import sys
 
-@dataclass
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# Prediction files above this size are streamed with ijson when it is installed
+STREAM_THRESHOLD = 256 * 1024 * 1024
+
+@dataclass(slots=True, frozen=True)
 class Relation:
     type: str
     target: str
     target_type: str
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Context:
     sentence: str
-    other_entities: List[Dict[str, str]]
+    # (text, type) pairs of the other entities in the sentence
+    other_entities: Tuple[Tuple[str, str], ...]
     relations: List[Relation]
 
-@dataclass
+@dataclass(slots=True)
 class Entity:
     text: str
     type: str
-    contexts: List[Context]
+    # (sentence index, entity index) of each mention; contexts are built from these on demand
+    _context_refs: List[Tuple[int, int]] = field(default_factory=list, repr=False)
+    _source: Optional["EntityProcessor"] = field(default=None, repr=False, compare=False)
+    _contexts: Optional[List[Context]] = field(default=None, repr=False, compare=False)
+
+    @property
+    def contexts(self) -> List[Context]:
+        """Contexts of every mention, built on first access"""
+        if self._contexts is None:
+            self._contexts = [self._source._build_context(s, i) for s, i in self._context_refs]
+        return self._contexts
 
 class EntityProcessor:
     def __init__(self, predictions_file: Path):
         self.entities: Dict[str, Entity] = {}
+        # Per-sentence data shared by all lazily built contexts
+        self._sentences: List[str] = []
+        self._entity_maps: List[Tuple[Tuple[str, str], ...]] = []
+        self._relations: List[Dict[int, List[Tuple[str, int]]]] = []
         self._load_and_process(predictions_file)
+        # Lowercased entity texts, built once for case-insensitive search
+        self._lowered = [(text.lower(), entity) for text, entity in self.entities.items()]
     
     def _load_and_process(self, predictions_file: Path) -> None:
-        with open(predictions_file) as f:
-            predictions = json.load(f)
-            
+        predictions_file = Path(predictions_file)
+        
+        # Stream very large files one prediction at a time instead of loading them whole
+        if IJSON_AVAILABLE and predictions_file.stat().st_size > STREAM_THRESHOLD:
+            with open(predictions_file, 'rb') as f:
+                for pred in ijson.items(f, 'item'):
+                    self._process_pred(pred)
+            return
+        
+        if ORJSON_AVAILABLE:
+            predictions = orjson.loads(predictions_file.read_bytes())
+        else:
+            with open(predictions_file) as f:
+                predictions = json.load(f)
+        
         for pred in predictions:
-            tokens = pred['tokens']
-            sentence = ' '.join(tokens)
-            entities = pred.get('entities', [])
-            relations = pred.get('relations', [])
+            self._process_pred(pred)
+    
+    def _process_pred(self, pred: dict) -> None:
+        """Record the entity mentions of one predicted sentence"""
+        # Local bindings for the hot loop
+        all_entities = self.entities
+        Entity_ = Entity
+        intern = sys.intern
+        
+        entities = pred.get('entities', [])
+        if not entities:
+            return
+        tokens = pred['tokens']
+        relations = pred.get('relations', [])
+        sent_idx = len(self._sentences)
+        
+        entity_map = []
+        for idx, entity in enumerate(entities):
+            text = ' '.join(tokens[entity['start']:entity['end']])
+            entity_type = intern(entity['type'])
             
-            entity_map = {}
-            for idx, entity in enumerate(entities):
-                text = ' '.join(tokens[entity['start']:entity['end']])
-                entity_type = entity['type']
-                
-                if text not in self.entities:
-                    self.entities[text] = Entity(text=text, type=entity_type, contexts=[])
-                
-                entity_map[idx] = (text, entity_type)
+            e = all_entities.get(text)
+            if e is None:
+                e = all_entities[text] = Entity_(text=text, type=entity_type, _source=self)
+            e._context_refs.append((sent_idx, idx))
             
-            for idx, (text, _) in entity_map.items():
-                other_entities = [
-                    {'text': e_text, 'type': e_type}
-                    for i, (e_text, e_type) in entity_map.items()
-                    if i != idx
-                ]
-                
-                entity_relations = []
-                for relation in relations:
-                    if relation['head'] == idx:
-                        target_text, target_type = entity_map[relation['tail']]
-                        entity_relations.append(Relation(
-                            type=relation['type'],
-                            target=target_text,
-                            target_type=target_type
-                        ))
-                    elif relation['tail'] == idx:
-                        source_text, source_type = entity_map[relation['head']]
-                        entity_relations.append(Relation(
-                            type=relation['type'],
-                            target=source_text,
-                            target_type=source_type
-                        ))
-                
-                # Add context to entity
-                self.entities[text].contexts.append(Context(
-                    sentence=sentence,
-                    other_entities=other_entities,
-                    relations=entity_relations
-                ))
+            entity_map.append((text, entity_type))
+        
+        # Relations touching each entity, in file order, as (type, other entity idx)
+        related = defaultdict(list)
+        for relation in relations:
+            head, tail = relation['head'], relation['tail']
+            rel_type = intern(relation['type'])
+            related[head].append((rel_type, tail))
+            if tail != head:
+                related[tail].append((rel_type, head))
+        
+        self._sentences.append(' '.join(tokens))
+        self._entity_maps.append(tuple(entity_map))
+        self._relations.append(dict(related))
     
+    def _build_context(self, sent_idx: int, idx: int) -> Context:
+        """Build the context of entity idx in sentence sent_idx"""
+        entity_map = self._entity_maps[sent_idx]
+        return Context(
+            sentence=self._sentences[sent_idx],
+            other_entities=entity_map[:idx] + entity_map[idx + 1:],
+            relations=[
+                Relation(type=rel_type, target=entity_map[other][0], target_type=entity_map[other][1])
+                for rel_type, other in self._relations[sent_idx].get(idx, ())
+            ]
+        )
+
     def search(self, query: str) -> List[Entity]:
         """Search for entities containing the query string"""
-        return [
-            entity for text, entity in self.entities.items()
-            if query.lower() in text.lower()
-        ]
+        query = query.lower()
+        return [entity for text, entity in self._lowered if query in text]
     
     def get_all_entities(self) -> List[Entity]:
         """Get all entities"""
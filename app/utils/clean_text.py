@@ -1,25 +1,74 @@
+import mmap
+import os
 import re
 from tqdm import tqdm
 
-CLEAN_RE = re.compile(r"\d+|[_*#=]+")
+# Cleaned output is buffered and written in blocks of about this many characters
+WRITE_BUFFER_SIZE = 1 << 22
+# Progress is reported once per this many bytes read
+PROGRESS_STEP = 1 << 20
 
-def preprocess_stream(input_file, output_file):
-    with open(input_file, "r", encoding="utf-8") as fin, \
-         open(output_file, "w", encoding="utf-8") as fout:
+# _*#= are deleted with str.translate and digits with a regex; whitespace is collapsed by split/join
+STRIP_TABLE = str.maketrans("", "", "_*#=")
+DIGITS_RE = re.compile(r"\d+")
+
+def read_lines(input_file, progress=None):
+    """Yield the lines of a UTF-8 file, reading it through a read-only memory map
+
+    progress, if given, is called with the number of bytes read since its last call.
+    """
+    with open(input_file, "rb") as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pending = 0
+            for line in iter(mm.readline, b""):
+                if progress is not None:
+                    pending += len(line)
+                    if pending >= PROGRESS_STEP:
+                        progress(pending)
+                        pending = 0
+                yield line.decode("utf-8")
+            if progress is not None and pending:
+                progress(pending)
 
-        inside_book = False
-        for line in tqdm(fin, desc="Cleaning text"):
-            if "START OF THE PROJECT GUTENBERG EBOOK" in line:
-                inside_book = True
-                continue
-            if "END OF THE PROJECT GUTENBERG EBOOK" in line:
-                break
+def clean_lines(lines):
+    """Yield the cleaned, non-empty lines between the Gutenberg START and END markers"""
+    lines = iter(lines)
+    # Skip the header; there is nothing to yield if END comes first or START never does
+    for line in lines:
+        if "START OF THE PROJECT GUTENBERG EBOOK" in line:
+            break
+        if "END OF THE PROJECT GUTENBERG EBOOK" in line:
+            return
 
-            if not inside_book:
-                continue
+    sub = DIGITS_RE.sub
+    for line in lines:
+        if "END OF THE PROJECT GUTENBERG EBOOK" in line:
+            break
 
-            line = CLEAN_RE.sub("", line)
-            line = re.sub(r"[ \t]+", " ", line).strip()
+        line = " ".join(sub("", line.translate(STRIP_TABLE)).split())
+
+        if line:
+            yield line
+
+def preprocess_stream(input_file, output_file):
+    with open(output_file, "w", encoding="utf-8") as fout, \
+         tqdm(total=os.path.getsize(input_file), unit="B", unit_scale=True, desc="Cleaning text") as pbar:
+        buf = []
+        buf_len = 0
+        append = buf.append
+        for line in clean_lines(read_lines(input_file, pbar.update)):
+            append(line)
+            append("\n")
+            buf_len += len(line) + 1
+            if buf_len > WRITE_BUFFER_SIZE:
+                fout.write("".join(buf))
+                buf.clear()
+                buf_len = 0
+        fout.write("".join(buf))
 
-            if line:
-                fout.write(line + "\n")
+def preprocess_to_string(input_file) -> str:
+    """Clean a Gutenberg file and return the result instead of writing it to disk"""
+    return "".join(line + "\n" for line in clean_lines(read_lines(input_file)))
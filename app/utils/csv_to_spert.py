@@ -1,147 +1,277 @@
-import pandas as pd
+import csv
 import json
 import os
 import sys
-import random
+import argparse
+from itertools import compress, islice
+from operator import itemgetter
 from sklearn.model_selection import train_test_split
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-# Get CSV file path from command line argument or use default
-csv_file = sys.argv[1] if len(sys.argv) > 1 else "app/data/annotated_csv_data/first_annotations.csv"
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
-# Get output directory from command line argument or use default
-output_dir = sys.argv[2] if len(sys.argv) > 2 else "spert/data"
+# Rows scanned at a time in the first pass
+CHUNK_SIZE = 10_000
+# Examples handed to a split's writer thread at a time
+WRITE_BATCH_SIZE = 1_000
 
-print(f"Reading CSV from: {csv_file}")
-print(f"Output directory: {output_dir}")
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Convert annotated CSV data to SpERT JSON format")
+    parser.add_argument("--csv", default="app/data/annotated_csv_data/first_annotations.csv", help="Annotated CSV file")
+    parser.add_argument("--out-dir", default="spert/data", help="Output directory for the SpERT dataset")
+    parser.add_argument("--pretty", action="store_true", help="Indent the split files for human reading")
+    return parser.parse_args()
 
-try:
-    df = pd.read_csv(csv_file)  
-    # required columns: sentence, entity1, entity1_label, entity2, entity2_label, relation
-    print(f"Successfully loaded {len(df)} rows from CSV")
-except FileNotFoundError:
-    print(f"Error: CSV file not found at {csv_file}")
-    sys.exit(1)
-except Exception as e:
-    print(f"Error reading CSV file: {e}")
-    sys.exit(1)
-
-data = []
-entity_types = set()
-relation_types = set()
-
-for _, row in df.iterrows():
-    sentence = row['sentence']
+def find_entity_index(padded, entity_tokens):
+    """Return the start index of entity_tokens within the padded sentence, or None"""
+    # padded is " " + " ".join(tokens) + " ", so a space-delimited substring search matches whole tokens
+    # and the number of spaces before the match is the token index
+    pos = padded.find(" " + " ".join(entity_tokens) + " ")
+    if pos == -1:
+        return None
+    return padded.count(" ", 0, pos)
+
+def entity_found(padded, entity):
+    """Return whether a CSV entity cell occurs as whole tokens in the padded sentence"""
+    entity_tokens = entity.split()
+    return bool(entity_tokens) and find_entity_index(padded, entity_tokens) is not None
+
+def iter_rows(csv_file):
+    """Yield the CSV rows as plain tuples, streaming the file with the csv module"""
+    columns = ('sentence', 'entity1', 'entity1_label', 'entity2', 'entity2_label', 'relation')
+    # utf-8-sig drops a byte order mark, as pandas did
+    with open(csv_file, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"missing column(s): {', '.join(missing)}")
+        # Missing cells are already empty strings, so no per-row NaN checks are needed
+        get = itemgetter(*(header.index(column) for column in columns))
+        for row in reader:
+            if row:
+                yield get(row)
+
+def build_example(sentence, entity1, entity1_label, entity2, entity2_label, relation):
+    """Convert one CSV row into a SpERT example tuple: (tokens, [(start, end, type)], relation or None)"""
     tokens = sentence.split()  # basic whitespace tokenization
+    padded = " " + " ".join(tokens) + " "
 
     # Find start indices of entities
-    e1_tokens = row['entity1'].split() if isinstance(row['entity1'], str) else []
-    e2_tokens = row['entity2'].split() if isinstance(row['entity2'], str) else []
-
-    def find_entity_index(tokens, entity_tokens):
-        for i in range(len(tokens)):
-            if tokens[i:i+len(entity_tokens)] == entity_tokens:
-                return i
-        return None
+    e1_tokens = entity1.split()
+    e2_tokens = entity2.split()
 
-    e1_start = find_entity_index(tokens, e1_tokens) if e1_tokens else None
-    e2_start = find_entity_index(tokens, e2_tokens) if e2_tokens else None
+    e1_start = find_entity_index(padded, e1_tokens) if e1_tokens else None
+    e2_start = find_entity_index(padded, e2_tokens) if e2_tokens else None
 
     entities = []
-    relations = []
-
     if e1_start is not None:
-        entities.append({
-            "id": len(entities),
-            "start": e1_start,
-            "end": e1_start + len(e1_tokens),
-            "type": row['entity1_label']
-        })
-        entity_types.add(row['entity1_label'])
-
+        entities.append((e1_start, e1_start + len(e1_tokens), entity1_label))
     if e2_start is not None:
-        entities.append({
-            "id": len(entities),
-            "start": e2_start,
-            "end": e2_start + len(e2_tokens),
-            "type": row['entity2_label']
-        })
-        entity_types.add(row['entity2_label'])
-
-    if len(entities) == 2 and isinstance(row['relation'], str) and row['relation'].strip():
-        relations.append({
-            "head": 0,
-            "tail": 1,
-            "type": row['relation'],
-            "direction": "L2R"
-        })
-        relation_types.add(row['relation'])
-
-    data.append({
+        entities.append((e2_start, e2_start + len(e2_tokens), entity2_label))
+
+    if len(entities) == 2 and relation.strip():
+        return tokens, entities, relation
+    return tokens, entities, None
+
+def example_to_dict(tokens, entities, relation):
+    """Expand an example tuple into the SpERT example dict"""
+    return {
         "tokens": tokens,
-        "entities": entities,
-        "relations": relations
-    })
+        "entities": [
+            {"id": i, "start": start, "end": end, "type": entity_type}
+            for i, (start, end, entity_type) in enumerate(entities)
+        ],
+        "relations": [
+            {"head": 0, "tail": 1, "type": relation, "direction": "L2R"}
+        ] if relation is not None else []
+    }
+
+def dumps_compact(item):
+    """Serialize item to compact UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(item)
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_example(tokens, entities, relation):
+    """Serialize an example tuple to the same bytes as dumps_compact(example_to_dict(...)) without building the dicts"""
+    entities_json = b",".join(
+        b'{"id":%d,"start":%d,"end":%d,"type":%s}' % (i, start, end, dumps_compact(entity_type))
+        for i, (start, end, entity_type) in enumerate(entities)
+    )
+    relations_json = b'{"head":0,"tail":1,"type":%s,"direction":"L2R"}' % dumps_compact(relation) if relation is not None else b""
+    return b'{"tokens":%s,"entities":[%s],"relations":[%s]}' % (dumps_compact(tokens), entities_json, relations_json)
 
-os.makedirs(output_dir, exist_ok=True)
+class JsonArrayWriter:
+    """Write example tuples as a JSON array one element at a time, compact or laid out like json.dump(..., indent=2)"""
 
-# Stratify by relation type if possible
-stratify_labels = []
-for ex in data:
-    if ex.get("relations"):
-        stratify_labels.append(ex["relations"][0]["type"])
+    def __init__(self, path, pretty=False):
+        self.path = path
+        self.pretty = pretty
+        self.count = 0
+        self.f = open(path, "wb")
+        self.f.write(b"[")
+
+    def write(self, example):
+        if self.pretty:
+            item = example_to_dict(*example)
+            self.f.write(b",\n  " if self.count else b"\n  ")
+            self.f.write(json.dumps(item, ensure_ascii=False, indent=2).replace("\n", "\n  ").encode("utf-8"))
+        else:
+            if self.count:
+                self.f.write(b",")
+            self.f.write(dumps_example(*example))
+        self.count += 1
+
+    def write_many(self, examples):
+        for example in examples:
+            self.write(example)
+
+    def close(self):
+        self.f.write(b"\n]" if self.pretty and self.count else b"]")
+        self.f.close()
+
+def write_splits(writers, split_examples):
+    """Write (split, example) pairs to their writers, each split on its own thread"""
+    # A single-worker executor per split keeps that split's examples in order, and waiting for
+    # the previous batch before submitting the next holds at most two batches per split in memory
+    executors = [ThreadPoolExecutor(max_workers=1) for _ in writers]
+    pending = [None] * len(writers)
+    batches = [[] for _ in writers]
+
+    def submit(split):
+        if pending[split] is not None:
+            pending[split].result()
+        pending[split] = executors[split].submit(writers[split].write_many, batches[split])
+        batches[split] = []
+
+    try:
+        for split, example in split_examples:
+            batches[split].append(example)
+            if len(batches[split]) >= WRITE_BATCH_SIZE:
+                submit(split)
+        for split, batch in enumerate(batches):
+            if batch:
+                submit(split)
+        for future in pending:
+            if future is not None:
+                future.result()
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+def main():
+    args = parse_arguments()
+    csv_file = args.csv
+    output_dir = args.out_dir
+
+    print(f"Reading CSV from: {csv_file}")
+    print(f"Output directory: {output_dir}")
+
+    # First pass: collect the split labels and the entity/relation types without building the examples
+    stratify_labels = []
+    entity_types = set()
+    relation_types = set()
+
+    try:
+        rows = iter_rows(csv_file)
+        while batch := list(islice(rows, CHUNK_SIZE)):
+            sentences, entities1, labels1, entities2, labels2, relations = zip(*batch)
+            padded = [" " + " ".join(sentence.split()) + " " for sentence in sentences]
+            found1 = list(map(entity_found, padded, entities1))
+            found2 = list(map(entity_found, padded, entities2))
+            has_relation = [f1 and f2 and bool(relation.strip()) for f1, f2, relation in zip(found1, found2, relations)]
+
+            # Types of the entities and relations that make it into an example
+            entity_types.update(compress(labels1, found1))
+            entity_types.update(compress(labels2, found2))
+            relation_types.update(compress(relations, has_relation))
+            # Stratify by relation type if possible
+            stratify_labels += [relation if has else "NoRelation" for relation, has in zip(relations, has_relation)]
+        entity_types.discard("")
+        print(f"Successfully loaded {len(stratify_labels)} rows from CSV")
+    except FileNotFoundError:
+        print(f"Error: CSV file not found at {csv_file}")
+        return 1
+    except Exception as e:
+        print(f"Error reading CSV file: {e}")
+        return 1
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, name) for name in ("train.json", "dev.json", "test.json", "types.json")}
+
+    indices = list(range(len(stratify_labels)))
+    if len(set(stratify_labels)) > 1:
+        train_idx, temp_idx = train_test_split(
+            indices, test_size=0.2, random_state=42, stratify=stratify_labels
+        )
     else:
-        stratify_labels.append("NoRelation")
+        train_idx, temp_idx = train_test_split(indices, test_size=0.2, random_state=42)
 
-if len(set(stratify_labels)) > 1:
-    train_data, temp_data, _, _ = train_test_split(
-        data, stratify_labels, test_size=0.2, random_state=42, stratify=stratify_labels
-    )
-else:
-    train_data, temp_data = train_test_split(data, test_size=0.2, random_state=42)
+    dev_idx, test_idx = train_test_split(temp_idx, test_size=0.5, random_state=42)
 
-dev_data, test_data = train_test_split(temp_data, test_size=0.5, random_state=42)
+    # Split of each row: 0 = train, 1 = dev, 2 = test
+    assignment = [0] * len(indices)
+    for i in dev_idx:
+        assignment[i] = 1
+    for i in test_idx:
+        assignment[i] = 2
 
-splits = {"train.json": train_data, "dev.json": dev_data, "test.json": test_data}
-for filename, split_data in splits.items():
-    path = os.path.join(output_dir, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(split_data, f, ensure_ascii=False, indent=2)
-    print(f"Saved {len(split_data)} examples to {path}")
+    # Second pass: rebuild each example and stream it into its split file, the three files being
+    # serialized and written concurrently
+    writers = [JsonArrayWriter(paths[name], args.pretty) for name in ("train.json", "dev.json", "test.json")]
+    try:
+        write_splits(writers, (
+            (split, build_example(*row)) for split, row in zip(assignment, iter_rows(csv_file))
+        ))
+    finally:
+        for writer in writers:
+            writer.close()
 
+    for writer in writers:
+        print(f"Saved {writer.count} examples to {writer.path}")
 
-types = {
-    "entities": {},
-    "relations": {}
-}
+    # Every example holds at most one relation, which is also its stratify label
+    relation_counts = []
+    for split_idx in (train_idx, dev_idx, test_idx):
+        counts = Counter(stratify_labels[i] for i in split_idx)
+        counts.pop("NoRelation", None)
+        relation_counts.append(counts)
 
-for et in sorted(entity_types):
-    types["entities"][et] = {
-        "short": et,
-        "verbose": et
+    types = {
+        "entities": {},
+        "relations": {}
     }
 
-for rt in sorted(relation_types):
-    types["relations"][rt] = {
-        "short": rt,
-        "verbose": rt,
-        "symmetric": False
-    }
+    for et in sorted(entity_types):
+        types["entities"][et] = {
+            "short": et,
+            "verbose": et
+        }
+
+    for rt in sorted(relation_types):
+        types["relations"][rt] = {
+            "short": rt,
+            "verbose": rt,
+            "symmetric": False
+        }
 
-with open(os.path.join(output_dir, "types.json"), "w", encoding="utf-8") as f:
-    json.dump(types, f, ensure_ascii=False, indent=2)
+    with open(paths["types.json"], "w", encoding="utf-8") as f:
+        json.dump(types, f, ensure_ascii=False, indent=2)
 
-print(f"Saved types.json to {os.path.join(output_dir, 'types.json')}")
+    print(f"Saved types.json to {paths['types.json']}")
 
+    print("Train relations:", dict(relation_counts[0]))
+    print("Dev relations:", dict(relation_counts[1]))
+    print("Test relations:", dict(relation_counts[2]))
+    print("Generated types.json with", len(entity_types), "entity types and", len(relation_types), "relation types.")
 
-def count_relations(dataset):
-    counter = Counter()
-    for ex in dataset:
-        for r in ex.get("relations", []):
-            counter[r["type"]] += 1
-    return dict(counter)
+    return 0
 
-print("Train relations:", count_relations(train_data))
-print("Dev relations:", count_relations(dev_data))
-print("Test relations:", count_relations(test_data))
-print("Generated types.json with", len(entity_types), "entity types and", len(relation_types), "relation types.")
+if __name__ == "__main__":
+    sys.exit(main())
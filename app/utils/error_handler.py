@@ -3,7 +3,7 @@ Basic error handling utilities
 """
 import logging
 from pathlib import Path
-from datetime import datetime
+from time import perf_counter
 from typing import Callable, Any
 import functools
 
@@ -18,7 +18,7 @@ class SimpleProgressTracker:
     
     def start(self, total: int = 100):
         """Start progress tracking"""
-        self.start_time = datetime.now()
+        self.start_time = perf_counter()
         self.total = total
         self.current = 0
         print(f"{self.title}: Starting...")
@@ -35,7 +35,7 @@ class SimpleProgressTracker:
     
     def finish(self, status: str = "Complete"):
         """Finish progress tracking"""
-        elapsed = (datetime.now() - self.start_time).total_seconds() if self.start_time else 0
+        elapsed = perf_counter() - self.start_time if self.start_time is not None else 0
         print(f"{self.title}: {status} in {elapsed:.1f}s")
 
 class BasicErrorHandler:
@@ -62,9 +62,11 @@ class BasicErrorHandler:
 def safe_execute(operation_name: str, show_errors: bool = True):
     """Decorator for safe execution with basic error handling"""
     def decorator(func: Callable) -> Callable:
+        # One handler per decorated function; the success path only pays for the try block
+        error_handler = BasicErrorHandler()
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            error_handler = BasicErrorHandler()
             try:
                 return func(*args, **kwargs)
             except Exception as e:
@@ -0,0 +1,31 @@
+from collections import deque
+
+
+class LogFlusher:
+    """Screen mixin that coalesces RichLog writes and flushes them on a short timer; use from the event loop only"""
+
+    FLUSH_INTERVAL = 0.05
+    MAX_PENDING = 4096
+
+    def _start_log_flusher(self, log) -> None:
+        """Register the flush timer; call from on_mount"""
+        self._log = log
+        self._pending_log = deque()
+        self._pending_size = 0
+        self.set_interval(self.FLUSH_INTERVAL, self._flush_log)
+
+    def _queue_log(self, text: str) -> None:
+        """Buffer text for the next flush, flushing eagerly once the buffer is full"""
+        self._pending_log.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.MAX_PENDING:
+            self._flush_log()
+
+    def _flush_log(self) -> None:
+        """Write everything pending to the log in a single call"""
+        if not self._pending_log:
+            return
+        batch = "".join(self._pending_log)
+        self._pending_log.clear()
+        self._pending_size = 0
+        self._log.write(batch)
@@ -1,31 +1,38 @@
 
 import spacy
+from spacy.symbols import CARDINAL, ORDINAL
 import json
 import csv
 import re
 import argparse
-import gc
-from typing import List, Dict, Tuple, Optional
+import importlib.util
+import math
+import mmap
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain, combinations, count, repeat
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
 from pathlib import Path
 
-try:
-    import stanza
-    STANZA_AVAILABLE = True
-except ImportError:
-    STANZA_AVAILABLE = False
+# The coreference backends (transformers pulls in torch) are only imported by the functions that use
+# them, so runs without coreference resolution never pay for loading them
+STANZA_AVAILABLE = importlib.util.find_spec("stanza") is not None
+SPACY_EXPERIMENTAL_AVAILABLE = importlib.util.find_spec("spacy_experimental") is not None
+TRANSFORMERS_AVAILABLE = importlib.util.find_spec("transformers") is not None
 
 try:
-    import spacy
-    import spacy_experimental
-    SPACY_EXPERIMENTAL_AVAILABLE = True
+    import re2
+    RE2_AVAILABLE = True
 except ImportError:
-    SPACY_EXPERIMENTAL_AVAILABLE = False
+    RE2_AVAILABLE = False
 
 try:
-    from transformers import pipeline
-    TRANSFORMERS_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except ImportError:
-    TRANSFORMERS_AVAILABLE = False
+    ORJSON_AVAILABLE = False
 
 if not STANZA_AVAILABLE:
     print("Warning: Stanza not available. Install with: pip install stanza")
@@ -34,6 +41,43 @@ if not SPACY_EXPERIMENTAL_AVAILABLE:
 if not TRANSFORMERS_AVAILABLE:
     print("Warning: Transformers not available. Install with: pip install transformers torch")
 
+# Size of the text chunks fed to nlp.pipe
+NLP_CHUNK_SIZE = 100_000
+# Columns of the relation candidates CSV
+CSV_FIELDNAMES = (
+    "sentence",
+    "entity1", "entity1_label",
+    "entity2", "entity2_label",
+    "relation"
+)
+# Prompts per forward pass of the Transformers coreference pipeline
+TRANSFORMERS_BATCH_SIZE = 8
+# Chunks per batch of the spaCy experimental coreference components
+SPACY_COREF_BATCH_SIZE = 8
+
+_CLEAN_PATTERN = '|'.join([
+    r'\[\d+\]',
+    r'PLATE [IVXLC]+',
+    r'PLATES [IVXLC]+',
+    r'Fig\. \d+',
+    r'\(\d+\)',
+    r'§+',
+    r'\*+',
+    r'_{2,}',
+    r'={2,}',
+])
+# The alternation has no backreferences or lookarounds, so re2's linear-time matcher can run it
+_CLEAN_RE = re2.compile(_CLEAN_PATTERN) if RE2_AVAILABLE else re.compile(_CLEAN_PATTERN)
+_WS_RE = re.compile(r'\s+')
+# Sentence ends used to cut chunks; re2 runs it as a DFA (its \s is ASCII-only, which is all clean_text leaves)
+_SENT_END_RE = (re2 if RE2_AVAILABLE else re).compile(r'[.!?]+\s+')
+
+# Entity label IDs left out of the relation candidates; comparing ent.label skips building label_ strings
+_EXCLUDED_LABELS = frozenset({CARDINAL, ORDINAL})
+
+# Mentions the spaCy experimental coreference path replaces with their antecedent
+PRONOUNS = frozenset({"he", "she", "it", "they", "him", "her", "them"})
+
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Process text for NER and relation extraction')
     parser.add_argument('--input', default="text.txt", help='Input text file')
@@ -43,6 +87,16 @@ def parse_arguments():
     parser.add_argument('--spacy-experimental', action='store_true', help='Use spaCy experimental coreference resolution')
     parser.add_argument('--transformers-coref', action='store_true', help='Use Transformers-based coreference resolution')
     parser.add_argument('--no-coref', action='store_true', help='Skip coreference resolution entirely')
+    parser.add_argument('--coref-workers', type=int, default=1,
+                        help='Processes resolving coreference chunks in parallel when no GPU is used (each loads its own model)')
+    parser.add_argument('--batch-size', type=int, default=int(os.environ.get("SPACY_BATCH_SIZE", 64)),
+                        help='Number of text chunks per spaCy batch (default: $SPACY_BATCH_SIZE or 64)')
+    parser.add_argument('--fast-senter', action=argparse.BooleanOptionalAction, default=True,
+                        help='Split sentences with the lightweight senter instead of the dependency parser')
+    parser.add_argument('--n-process', type=int, default=max(1, (os.cpu_count() or 1) - 1), help='Number of processes for spaCy NER')
+    parser.add_argument('--gpu', action='store_true', help='Run spaCy on the GPU (requires spacy[cuda])')
+    parser.add_argument('--coref-prefetch', type=int, default=2,
+                        help='Chunks resolved ahead of NER in a background thread (0 to resolve them in line)')
     return parser.parse_args()
 
 def main():
@@ -62,119 +116,154 @@ def main():
         return
     
     print(f"[1/5] Loading text from {INPUT_FILE}...")
-    with open(INPUT_FILE, "r", encoding="utf-8") as f:
-        text = f.read()
+    text = read_text_mmap(INPUT_FILE)
     
     print(f"[2/5] Cleaning text...")
     text = clean_text(text)
     print(f"      Text cleaned. Length: {len(text)} characters.")
     
+    # texts holds the chunks that go into NER; with coreference resolution they are resolved lazily,
+    # one chunk at a time as nlp.pipe asks for them, so the resolved text is never joined back together
     print("[3/5] Applying coreference resolution...")
     if args.no_coref:
         print("      Skipping coreference resolution...")
-        resolved_text = text
+        texts = chunk_text(text, NLP_CHUNK_SIZE)
     elif args.stanza_coref:
-        print("      Using Stanza coreference resolution...")
-        resolved_text = safe_coref_resolution(text, "stanza")
+        print("      Using Stanza coreference resolution (resolved chunk by chunk during NER)...")
+        texts = safe_coref_resolution(text, "stanza", args.coref_workers)
     elif args.spacy_experimental:
-        print("      Using spaCy experimental coreference resolution...")
-        resolved_text = safe_coref_resolution(text, "spacy_experimental")
+        print("      Using spaCy experimental coreference resolution (resolved chunk by chunk during NER)...")
+        texts = safe_coref_resolution(text, "spacy_experimental", args.coref_workers)
     elif args.transformers_coref:
-        print("      Using Transformers coreference resolution...")
-        resolved_text = safe_coref_resolution(text, "transformers")
+        print("      Using Transformers coreference resolution (resolved chunk by chunk during NER)...")
+        texts = safe_coref_resolution(text, "transformers", args.coref_workers)
     else:
         print("      Skipping coreference resolution (default)...")
-        resolved_text = text
-    print(f"      Coreference processing completed.")
+        texts = chunk_text(text, NLP_CHUNK_SIZE)
     
     print("[4/5] Loading spaCy model...")
-    nlp = load_spacy_model()
+    if args.gpu:
+        # Must run before any spaCy model is loaded; batches then go to the GPU from a single process
+        spacy.require_gpu()
+        args.n_process = 1
+        print("      Using GPU for spaCy.")
+    nlp = None
+    shared_coref_nlp = False
+    if (SPACY_EXPERIMENTAL_AVAILABLE and args.spacy_experimental and not (args.no_coref or args.stanza_coref)
+            and args.coref_workers <= 1):
+        # Coreference runs in this process on a pipeline that already has every NER component,
+        # so share it rather than loading the model a second time
+        try:
+            nlp, _ = _get_spacy_coref_nlp()
+            shared_coref_nlp = True
+            if not args.fast_senter and "parser" in nlp.component_names and "senter" in nlp.pipe_names:
+                nlp.enable_pipe("parser")
+                nlp.disable_pipe("senter")
+        except Exception as e:
+            print(f"      Could not share the coreference pipeline, loading a separate one: {e}")
+    if nlp is None:
+        nlp = load_spacy_model(fast_senter=args.fast_senter)
     print("      spaCy model loaded successfully.")
     
     patterns = load_patterns(PATTERNS_FILE)
     if patterns:
         print(f"      Adding {len(patterns)} custom patterns...")
-        ruler = nlp.add_pipe("entity_ruler", before="ner")
+        patterns, phrase_attr = prepare_ruler_patterns(nlp, patterns)
+        ruler = nlp.add_pipe("entity_ruler", before="ner", config={"phrase_matcher_attr": phrase_attr})
         ruler.add_patterns(patterns)
         print("      Custom patterns added successfully.")
     else:
         print("      No custom patterns to add.")
     
     print("[5/5] Processing text with NER...")
-    resolved_doc = nlp(resolved_text)
+    if isinstance(texts, list):
+        # A book is only a handful of large chunks: shrink the batches so every worker gets some,
+        # and don't fork workers that would have no batch at all
+        args.batch_size = max(1, min(args.batch_size, math.ceil(len(texts) / args.n_process)))
+        args.n_process = max(1, min(args.n_process, math.ceil(len(texts) / args.batch_size)))
+        print(f"      {len(texts)} chunks in batches of {args.batch_size} over {args.n_process} process(es)")
+    # Coreference of the next chunks overlaps NER of the current one; not when both use the same pipeline,
+    # whose shared tok2vec cannot serve two threads at once, nor when nlp.pipe forks worker processes,
+    # which can hang if torch/OpenMP threads of the prefetching coreference are already running
+    if (args.coref_prefetch > 0 and not isinstance(texts, list) and not shared_coref_nlp
+            and args.n_process <= 1):
+        texts = prefetch(texts, args.coref_prefetch)
+    # Only the components that produce sentence boundaries and entities are run
+    enabled = [name for name in ("tok2vec", "tagger", "parser", "senter", "ner", "entity_ruler") if name in nlp.pipe_names]
+    with nlp.select_pipes(enable=enabled):
+        docs = nlp.pipe(texts, batch_size=args.batch_size, n_process=args.n_process)
+        # Candidates are generated lazily and written as the docs come out of the pipeline
+        rows = generate_relation_candidates(chain.from_iterable(doc.sents for doc in docs))
+        print(f"Saving results to {OUTPUT_FILE}...")
+        row_count = save_to_csv(rows, OUTPUT_FILE)
     print("      NER processing completed.")
-    
-    print("Generating relation candidates...")
-    rows = generate_relation_candidates(resolved_doc.sents)
-    print(f"      Generated {len(rows)} relation candidates.")
-    
-    print(f"Saving results to {OUTPUT_FILE}...")
-    save_to_csv(rows, OUTPUT_FILE)
+    print(f"      Generated {row_count} relation candidates.")
     
     print("=" * 60)
-    print(f"SUCCESS: Exported {len(rows)} sentences with at least one NE to {OUTPUT_FILE}")
+    print(f"SUCCESS: Exported {row_count} sentences with at least one NE to {OUTPUT_FILE}")
     print("=" * 60)
 
+def read_text_mmap(path: str) -> str:
+    """Decode a UTF-8 file straight from a read-only memory map, without an intermediate bytes copy."""
+    with open(path, "rb") as f:
+        # mmap cannot map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return str(view, "utf-8")
+
+
 def clean_text(text: str) -> str:
     """Remove unwanted characters and patterns from text."""
-    patterns = [
-        r'\[\d+\]',          
-        r'PLATE [IVXLC]+',   
-        r'PLATES [IVXLC]+',  
-        r'Fig\. \d+',        
-        r'\(\d+\)',          
-        r'§+',               
-        r'\*+',              
-        r'_{2,}',           
-        r'={2,}',           
-    ]
-    
-    combined_pattern = '|'.join(patterns)
-    cleaned_text = re.sub(combined_pattern, '', text)
-    cleaned_text = ' '.join(cleaned_text.split())
-    
-    return cleaned_text
+    cleaned_text = _CLEAN_RE.sub('', text)
+    return _WS_RE.sub(' ', cleaned_text).strip()
 
 
 def chunk_text(text: str, max_chunk_size: int = 5000) -> List[str]:
-    """Split text into smaller chunks for safer processing."""
+    """Split text into chunks of at most max_chunk_size characters, preferably at sentence ends."""
     if len(text) <= max_chunk_size:
         return [text]
     
-    chunks = []
-    sentences = re.split(r'[.!?]+\s+', text)
-    current_chunk = ""
-    
-    for sentence in sentences:
-        if len(current_chunk) + len(sentence) > max_chunk_size:
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                words = sentence.split()
-                temp_chunk = ""
-                for word in words:
-                    if len(temp_chunk) + len(word) + 1 > max_chunk_size:
-                        if temp_chunk:
-                            chunks.append(temp_chunk.strip())
-                            temp_chunk = word
-                        else:
-                            chunks.append(word)
-                    else:
-                        temp_chunk += " " + word if temp_chunk else word
-                if temp_chunk:
-                    current_chunk = temp_chunk
-        else:
-            current_chunk += ". " + sentence if current_chunk else sentence
+    # Chunks are slices of the original text between sentence-end offsets, so nothing is rebuilt
+    boundaries = [m.end() for m in _SENT_END_RE.finditer(text)]
+    boundaries.append(len(text))
     
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    chunks = []
+    start = 0
+    last_fit = 0
+    for boundary in boundaries:
+        if boundary - start > max_chunk_size:
+            if last_fit > start:
+                chunks.append(text[start:last_fit])
+                start = last_fit
+            # A sentence longer than a chunk is cut at the last space that fits
+            while boundary - start > max_chunk_size:
+                cut = text.rfind(" ", start + 1, start + max_chunk_size)
+                if cut == -1:
+                    cut = start + max_chunk_size
+                chunks.append(text[start:cut])
+                start = cut
+        last_fit = boundary
+    chunks.append(text[start:])
     
-    return chunks
+    return [chunk for chunk in map(str.strip, chunks) if chunk]
+
+
+def _resolve_coref_chunk(chunk: str, method: str) -> str:
+    """Resolve one chunk with the given method; runs in worker processes too, each caching its own model."""
+    if method == "stanza":
+        return stanza_coref_resolution(chunk)
+    elif method == "spacy_experimental":
+        return spacy_experimental_coref_resolution(chunk)
+    elif method == "transformers":
+        return transformers_coref_resolution(chunk)
+    else:
+        return chunk
 
 
-def safe_coref_resolution(text: str, method: str) -> str:
-    """Apply coreference resolution with chunking for large texts."""
+def safe_coref_resolution(text: str, method: str, workers: int = 1) -> Iterator[str]:
+    """Apply coreference resolution with chunking for large texts, yielding the resolved chunks in order."""
     size_limits = {
         "stanza": 30000,
         "spacy_experimental": 50000,
@@ -184,41 +273,183 @@ def safe_coref_resolution(text: str, method: str) -> str:
     max_size = size_limits.get(method, 50000)
     
     if len(text) <= max_size:
-        if method == "stanza":
-            return stanza_coref_resolution(text)
-        elif method == "spacy_experimental":
-            return spacy_experimental_coref_resolution(text)
-        elif method == "transformers":
-            return transformers_coref_resolution(text)
+        yield _resolve_coref_chunk(text, method)
+        return
+    
+    print(f"      Text is large ({len(text)} chars), processing in chunks...")
+    chunks = chunk_text(text, max_size)
+    # Chunks already yielded; a failure part-way continues from here rather than starting over
+    done = 0
+    
+    # CPU-bound methods scale across processes; with a GPU the workers would only contend for it
+    if workers > 1 and len(chunks) > 1 and not _gpu_available():
+        print(f"      Resolving {len(chunks)} chunks in {workers} processes...")
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                # map keeps the chunks in input order
+                for resolved_chunk in executor.map(_resolve_coref_chunk, chunks, repeat(method)):
+                    yield resolved_chunk
+                    done += 1
+            return
+        except Exception as e:
+            print(f"      Warning: Parallel coreference resolution failed, continuing in this process: {e}")
+    
+    if done == 0 and method == "stanza" and STANZA_AVAILABLE:
+        # Stanza batches all chunks through the pipeline in one call
+        try:
+            resolved_chunks = stanza_coref_resolution_batch(chunks)
+        except Exception as e:
+            print(f"      Warning: Batched Stanza processing failed, processing chunks one by one: {e}")
         else:
-            return text
-    else:
-        print(f"      Text is large ({len(text)} chars), processing in chunks...")
-        chunks = chunk_text(text, max_size)
-        resolved_chunks = []
-        
-        for i, chunk in enumerate(chunks):
-            print(f"      Processing chunk {i+1}/{len(chunks)}...")
-            try:
-                if method == "stanza":
-                    resolved_chunk = stanza_coref_resolution(chunk)
-                elif method == "spacy_experimental":
-                    resolved_chunk = spacy_experimental_coref_resolution(chunk)
-                elif method == "transformers":
-                    resolved_chunk = transformers_coref_resolution(chunk)
-                else:
-                    resolved_chunk = chunk
-                resolved_chunks.append(resolved_chunk)
-            except Exception as e:
-                print(f"      Warning: Chunk {i+1} failed, using original text: {e}")
-                resolved_chunks.append(chunk)
-        
-        return " ".join(resolved_chunks)
+            yield from resolved_chunks
+            return
+    elif done == 0 and method == "spacy_experimental" and SPACY_EXPERIMENTAL_AVAILABLE:
+        # The coreference components run over the chunks in batches, resolved chunks are yielded as they come
+        try:
+            for resolved_chunk in spacy_experimental_coref_resolution_batch(chunks):
+                yield resolved_chunk
+                done += 1
+            return
+        except Exception as e:
+            print(f"      Warning: Batched spaCy experimental processing failed, processing chunks one by one: {e}")
+    elif done == 0 and method == "transformers" and TRANSFORMERS_AVAILABLE:
+        # All chunk prompts go through the pipeline in batches
+        try:
+            resolved_chunks = transformers_coref_resolution_batch(chunks)
+        except Exception as e:
+            print(f"      Warning: Batched Transformers processing failed, processing chunks one by one: {e}")
+        else:
+            yield from resolved_chunks
+            return
+    
+    for i, chunk in enumerate(chunks[done:], done):
+        print(f"      Processing chunk {i+1}/{len(chunks)}...")
+        try:
+            yield _resolve_coref_chunk(chunk, method)
+        except Exception as e:
+            print(f"      Warning: Chunk {i+1} failed, using original text: {e}")
+            yield chunk
+
+
+def prefetch(items: Iterable[str], depth: int = 2) -> Iterator[str]:
+    """Yield items in order while a background thread produces up to depth items ahead."""
+    iterator = iter(items)
+    done = object()
+    # A single worker calls next() on the iterator one call after another, so order is kept
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        pending = deque(executor.submit(next, iterator, done) for _ in range(depth))
+        while True:
+            item = pending.popleft().result()
+            if item is done:
+                return
+            pending.append(executor.submit(next, iterator, done))
+            yield item
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+@lru_cache(maxsize=1)
+def _gpu_available() -> bool:
+    """Return whether torch is installed and can see a CUDA device."""
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+
+@lru_cache(maxsize=1)
+def _get_stanza_pipeline():
+    """Build the Stanza coreference pipeline once and reuse it for every chunk."""
+    import stanza
+    use_gpu = _gpu_available()
+    print(f"      Initializing Stanza pipeline ({'GPU' if use_gpu else 'CPU'})...")
+    return stanza.Pipeline('en', processors='tokenize,mwt,pos,lemma,ner,coref', use_gpu=use_gpu)
+
+
+@lru_cache(maxsize=1)
+def _get_spacy_coref_nlp() -> Tuple[spacy.Language, Tuple[str, ...]]:
+    """Load spaCy with the experimental coreference component once; main() reuses the same pipeline for NER.
+
+    Returns the pipeline and the names of the components coreference resolution runs.
+    """
+    import spacy_experimental  # noqa: F401 - registers the experimental_coref factory
+    print("      Loading spaCy with experimental coreference...")
+    nlp = load_spacy_model(with_coref=True)
+    # NER (and the entity ruler main() adds later) is left out of the coreference pass
+    return nlp, tuple(name for name in nlp.pipe_names if name != "ner")
+
+
+@lru_cache(maxsize=1)
+def _get_transformers_coref_pipeline():
+    """Load the Transformers text2text pipeline once, in fp16 on the GPU when there is one."""
+    # Note: This is a conceptual implementation - actual transformers coref might need different models
+    from transformers import pipeline
+    if _gpu_available():
+        import torch
+        print("      Loading Transformers coreference pipeline (GPU, fp16)...")
+        return pipeline("text2text-generation", model="google/flan-t5-base", device=0,
+                        torch_dtype=torch.float16, batch_size=TRANSFORMERS_BATCH_SIZE)
+    print("      Loading Transformers coreference pipeline (CPU)...")
+    return pipeline("text2text-generation", model="google/flan-t5-base", device=-1,
+                    batch_size=TRANSFORMERS_BATCH_SIZE)
+
+
+def _coref_prompt(text: str) -> str:
+    return f"Resolve all pronouns and coreferences in the following text, replacing them with their actual referents: {text}"
+
+
+def _splice_replacements(text: str, replacements) -> str:
+    """Apply (start, end, replacement) character-span replacements to text in a single forward pass."""
+    # Copy each span of the text once, in order, instead of re-slicing the whole string per mention
+    parts = []
+    cur = 0
+    for start, end, replacement in sorted(replacements):
+        if start < cur:
+            # Overlaps a mention that was already replaced
+            continue
+        parts.append(text[cur:start])
+        parts.append(replacement)
+        cur = end
+    parts.append(text[cur:])
+    
+    return "".join(parts)
+
+
+def _apply_stanza_coref(text: str, doc) -> str:
+    """Replace every mention in the Stanza document's coreference chains with the chain's longest mention."""
+    token_replacements = {}
+    
+    if hasattr(doc, 'coref') and doc.coref:
+        print(f"      Found {len(doc.coref)} coreference chains...")
+        for coref_chain in doc.coref:
+            representative = None
+            for mention in coref_chain:
+                if representative is None or len(mention.text) > len(representative.text):
+                    representative = mention
+            
+            for mention in coref_chain:
+                if mention != representative:
+                    start_pos = mention.start_char
+                    end_pos = mention.end_char
+                    token_replacements[(start_pos, end_pos)] = representative.text
+    
+    return _splice_replacements(text, ((start, end, replacement) for (start, end), replacement in token_replacements.items()))
+
+
+def stanza_coref_resolution_batch(chunks: List[str]) -> List[str]:
+    """Coreference resolution of several texts with a single batched Stanza call."""
+    import stanza
+    nlp_stanza = _get_stanza_pipeline()
+    print(f"      Processing {len(chunks)} chunks with Stanza in one batch...")
+    # Each chunk is its own Document, so mention offsets stay relative to that chunk
+    docs = nlp_stanza([stanza.Document([], text=chunk) for chunk in chunks])
+    return [_apply_stanza_coref(chunk, doc) for chunk, doc in zip(chunks, docs)]
 
 
 def stanza_coref_resolution(text: str) -> str:
-    """Coreference resolution using Stanza with memory-safe implementation."""
-    nlp_stanza = None
+    """Coreference resolution using Stanza, reusing one cached pipeline."""
     try:
         if not STANZA_AVAILABLE:
             print("      Stanza not available, falling back to original text...")
@@ -228,48 +459,63 @@ def stanza_coref_resolution(text: str) -> str:
             print("      Text too large for Stanza, using original text...")
             return text
         
-        print("      Initializing Stanza pipeline...")
-        nlp_stanza = stanza.Pipeline('en', processors='tokenize,mwt,pos,lemma,ner,coref', use_gpu=False)
+        nlp_stanza = _get_stanza_pipeline()
         
         print("      Processing text with Stanza...")
         doc = nlp_stanza(text)
         
-        resolved_text = []
-        
-        sentences = doc.sentences
-        
-        token_replacements = {}
-        
-        if hasattr(doc, 'coref') and doc.coref:
-            print(f"      Found {len(doc.coref)} coreference chains...")
-            for coref_chain in doc.coref:
-                representative = None
-                for mention in coref_chain:
-                    if representative is None or len(mention.text) > len(representative.text):
-                        representative = mention
-                
-                for mention in coref_chain:
-                    if mention != representative:
-                        start_pos = mention.start_char
-                        end_pos = mention.end_char
-                        token_replacements[(start_pos, end_pos)] = representative.text
-        
-        resolved_text = text
-        for (start, end), replacement in sorted(token_replacements.items(), reverse=True):
-            resolved_text = resolved_text[:start] + replacement + resolved_text[end:]
-        
-        return resolved_text
+        return _apply_stanza_coref(text, doc)
         
     except Exception as e:
         print(f"      Warning: Stanza coreference resolution failed: {e}")
         print("      Falling back to original text...")
         return text
+
+
+def _apply_spacy_coref(text: str, doc) -> str:
+    """Replace the pronouns of each coreference cluster in text with the cluster's main mention."""
+    # Replacements of pronoun mentions, as (start_char, end_char, antecedent text)
+    replacements = []
     
-    finally:
-        if nlp_stanza is not None:
-            del nlp_stanza
-        gc.collect()
-        print("      Memory cleanup completed.")
+    # Get coreference clusters and resolve them
+    if doc.spans.get("coref_clusters"):
+        clusters = doc.spans["coref_clusters"]
+        print(f"      Found {len(clusters)} coreference clusters")
+    
+        # Simple resolution: replace pronouns with their antecedents
+        # This is a basic implementation - spaCy experimental may have better methods
+        for cluster in clusters:
+            # Find the main mention (usually the longest or first proper noun)
+            main_mention = None
+            for mention in cluster:
+                if not main_mention or (len(mention.text) > len(main_mention.text) and mention.text[0].isupper()):
+                    main_mention = mention
+    
+            if main_mention:
+                # Replace the pronouns of this cluster, at their own positions, with the main mention
+                replacements.extend(
+                    (mention.start_char, mention.end_char, main_mention.text)
+                    for mention in cluster
+                    if mention != main_mention and mention.text.lower() in PRONOUNS
+                )
+    else:
+        print("      No coreference clusters found")
+    
+    return _splice_replacements(text, replacements)
+
+
+def spacy_experimental_coref_resolution_batch(chunks: List[str]) -> Iterator[str]:
+    """Coreference resolution of several texts, batching them through the spaCy coreference components."""
+    nlp, coref_pipes = _get_spacy_coref_nlp()
+    print(f"      Processing {len(chunks)} chunks with spaCy experimental in batches...")
+    # The components are chained by hand as nlp.pipe would, since main() may be streaming the shared
+    # pipeline through nlp.pipe with only the NER components selected
+    docs = (nlp.make_doc(chunk) for chunk in chunks)
+    for name in coref_pipes:
+        proc = nlp.get_pipe(name)
+        docs = proc.pipe(docs, batch_size=SPACY_COREF_BATCH_SIZE) if hasattr(proc, "pipe") else map(proc, docs)
+    for chunk, doc in zip(chunks, docs):
+        yield _apply_spacy_coref(chunk, doc)
 
 
 def spacy_experimental_coref_resolution(text: str) -> str:
@@ -288,44 +534,18 @@ def spacy_experimental_coref_resolution(text: str) -> str:
             print("      Text too large for spaCy experimental, using original text...")
             return text
         
-        # Load spaCy model with experimental coreference
-        print("      Loading spaCy with experimental coreference...")
-        nlp = spacy.load('en_core_web_sm')
-        
-        # Add experimental coreference component
-        nlp.add_pipe("experimental_coref")
+        # spaCy model with the experimental coreference component, loaded on first use
+        nlp, coref_pipes = _get_spacy_coref_nlp()
         
-        # Process the text
+        # Process the text, calling the components directly: this runs while main() streams the same
+        # pipeline through nlp.pipe with only the NER components selected
         print("      Processing text with spaCy experimental...")
-        doc = nlp(text)
-        
-        # Apply coreference resolution
-        resolved_text = text
-        
-        # Get coreference clusters and resolve them
-        if doc.spans.get("coref_clusters"):
-            clusters = doc.spans["coref_clusters"]
-            print(f"      Found {len(clusters)} coreference clusters")
-            
-            # Simple resolution: replace pronouns with their antecedents
-            # This is a basic implementation - spaCy experimental may have better methods
-            for cluster in clusters:
-                # Find the main mention (usually the longest or first proper noun)
-                main_mention = None
-                for mention in cluster:
-                    if not main_mention or (len(mention.text) > len(main_mention.text) and mention.text[0].isupper()):
-                        main_mention = mention
-                
-                if main_mention:
-                    # Replace pronouns in the cluster with the main mention
-                    for mention in cluster:
-                        if mention != main_mention and mention.text.lower() in ['he', 'she', 'it', 'they', 'him', 'her', 'them']:
-                            # Simple replacement (this could be improved)
-                            resolved_text = resolved_text.replace(mention.text, main_mention.text)
-        else:
-            print("      No coreference clusters found")
+        components = dict(nlp.components)
+        doc = nlp.make_doc(text)
+        for name in coref_pipes:
+            doc = components[name](doc)
         
-        return resolved_text
+        return _apply_spacy_coref(text, doc)
             
     except Exception as e:
         print(f"      Warning: spaCy experimental coreference resolution failed: {e}")
@@ -349,16 +569,11 @@ def transformers_coref_resolution(text: str) -> str:
             print("      Text too large for Transformers, using original text...")
             return text
         
-        # Initialize the coreference resolution pipeline
-        print("      Loading Transformers coreference pipeline...")
-        # Note: This is a conceptual implementation - actual transformers coref might need different models
-        coref_pipeline = pipeline("text2text-generation", model="google/flan-t5-base")
-        
-        # Create a prompt for coreference resolution
-        prompt = f"Resolve all pronouns and coreferences in the following text, replacing them with their actual referents: {text}"
+        # Coreference resolution pipeline, loaded on first use
+        coref_pipeline = _get_transformers_coref_pipeline()
         
         print("      Processing text with Transformers...")
-        result = coref_pipeline(prompt, max_length=len(text) + 100, do_sample=False)
+        result = coref_pipeline(_coref_prompt(text), max_new_tokens=len(text) + 100, do_sample=False)
         
         resolved_text = result[0]['generated_text']
         print("      Transformers coreference resolution completed")
@@ -370,16 +585,39 @@ def transformers_coref_resolution(text: str) -> str:
         return text
 
 
-def load_spacy_model() -> spacy.Language:
-    """Load and configure the spaCy model."""
+def transformers_coref_resolution_batch(chunks: List[str]) -> List[str]:
+    """Coreference resolution of several texts, batching their prompts through one pipeline call."""
+    coref_pipeline = _get_transformers_coref_pipeline()
+    print(f"      Processing {len(chunks)} chunks with Transformers in batches of {TRANSFORMERS_BATCH_SIZE}...")
+    results = coref_pipeline(
+        [_coref_prompt(chunk) for chunk in chunks],
+        batch_size=TRANSFORMERS_BATCH_SIZE,
+        max_new_tokens=max(len(chunk) for chunk in chunks) + 100,
+        do_sample=False,
+    )
+    # A list input gives one dict per prompt
+    return [result['generated_text'] for result in results]
+
+
+def load_spacy_model(disable: Tuple[str, ...] = ("lemmatizer", "attribute_ruler"), fast_senter: bool = True,
+                     with_coref: bool = False) -> spacy.Language:
+    """Load and configure the spaCy model, skipping components whose output is never read."""
     try:
-        # Try to load the English model
-        nlp = spacy.load("en_core_web_sm")
+        # Try to load the English model; doc.sents needs either the parser or the senter
+        nlp = spacy.load("en_core_web_sm", disable=list(disable))
     except OSError:
         print("English model not found. Please install it with:")
         print("python -m spacy download en_core_web_sm")
         raise
     
+    # Only sentence boundaries are used, which the senter gives much faster than the parser
+    if fast_senter and "senter" in nlp.component_names and "parser" in nlp.pipe_names:
+        nlp.enable_pipe("senter")
+        nlp.disable_pipe("parser")
+    
+    if with_coref:
+        nlp.add_pipe("experimental_coref")
+    
     return nlp
 
 
@@ -387,6 +625,8 @@ def load_patterns(patterns_file: str) -> List[Dict]:
     """Load entity patterns from JSON file."""
     patterns_path = Path(patterns_file)
     if patterns_path.exists():
+        if ORJSON_AVAILABLE:
+            return orjson.loads(patterns_path.read_bytes())
         with open(patterns_path, "r", encoding="utf-8") as f:
             return json.load(f)
     else:
@@ -394,66 +634,82 @@ def load_patterns(patterns_file: str) -> List[Dict]:
         return []
 
 
+def _lower_phrase(nlp, pattern) -> Optional[str]:
+    """Return the phrase a LOWER-only token pattern matches exactly, or None."""
+    if isinstance(pattern, str) or not pattern:
+        return None
+    if any(list(token) != ["LOWER"] or not isinstance(token["LOWER"], str) for token in pattern):
+        return None
+    words = [token["LOWER"] for token in pattern]
+    phrase = " ".join(words)
+    # Only a phrase that tokenizes back into exactly these words matches the same spans
+    if [token.lower_ for token in nlp.make_doc(phrase)] != words:
+        return None
+    return phrase
+
+
+def prepare_ruler_patterns(nlp, patterns: List[Dict]) -> Tuple[List[Dict], str]:
+    """Pick the entity ruler's phrase_matcher_attr and rewrite patterns so most of them run on its PhraseMatcher."""
+    # Phrase patterns are matched for all entries at once, token patterns one by one; every
+    # rewrite below matches exactly the same spans, and all entries stay in one ruler so
+    # overlapping matches are still resolved together
+    lower_phrases = [_lower_phrase(nlp, entry["pattern"]) for entry in patterns]
+    lower_count = sum(phrase is not None for phrase in lower_phrases)
+    orth_count = sum(isinstance(entry["pattern"], str) for entry in patterns)
+    if lower_count <= orth_count:
+        return patterns, "ORTH"
+
+    rewritten = []
+    for entry, phrase in zip(patterns, lower_phrases):
+        if phrase is not None:
+            entry = {**entry, "pattern": phrase}
+        elif isinstance(entry["pattern"], str):
+            # Case-sensitive phrases move to the token matcher as ORTH patterns
+            tokens = [{"ORTH": token.text} for token in nlp.make_doc(entry["pattern"])]
+            if not tokens:
+                continue
+            entry = {**entry, "pattern": tokens}
+        rewritten.append(entry)
+    return rewritten, "LOWER"
+
+
 def extract_entities(sent) -> List[Tuple[str, str]]:
     """Extract entities from a sentence, filtering out unwanted types."""
     return [(ent.text, ent.label_) 
             for ent in sent.ents 
-            if ent.label_ not in ["CARDINAL", "ORDINAL"]]
+            if ent.label not in _EXCLUDED_LABELS]
 
 
-def generate_relation_candidates(sentences) -> List[Dict[str, str]]:
-    """Generate relation candidates from processed sentences."""
-    rows = []
-    
+def generate_relation_candidates(sentences) -> Iterator[Tuple[str, str, str, str, str, str]]:
+    """Yield relation candidates from processed sentences as rows in CSV_FIELDNAMES order."""
     for sent in sentences:
         # Extract entities from the sentence
         ents = extract_entities(sent)
         
         # Keep only sentences with at least 1 NE (after filtering cardinals)
-        if len(ents) >= 1:
-            if len(ents) >= 2:
-                # Generate all possible entity pairs
-                for i in range(len(ents)):
-                    for j in range(i+1, len(ents)):
-                        e1_text, e1_label = ents[i]
-                        e2_text, e2_label = ents[j]
-                        rows.append({
-                            "sentence": sent.text.strip(),
-                            "entity1": e1_text,
-                            "entity1_label": e1_label,
-                            "entity2": e2_text,
-                            "entity2_label": e2_label,
-                            "relation": ""  # leave blank for annotation
-                        })
-            else:
-                # Sentence has only one NE -> still include for reference (no pair)
-                e1_text, e1_label = ents[0]
-                rows.append({
-                    "sentence": sent.text.strip(),
-                    "entity1": e1_text,
-                    "entity1_label": e1_label,
-                    "entity2": "",
-                    "entity2_label": "",
-                    "relation": ""
-                })
-    
-    return rows
+        if not ents:
+            continue
+        sent_text = sent.text.strip()
+        if len(ents) == 1:
+            # Sentence has only one NE -> still include for reference (no pair)
+            e1_text, e1_label = ents[0]
+            yield (sent_text, e1_text, e1_label, "", "", "")
+        else:
+            # Generate all possible entity pairs; relation is left blank for annotation
+            for (e1_text, e1_label), (e2_text, e2_label) in combinations(ents, 2):
+                yield (sent_text, e1_text, e1_label, e2_text, e2_label, "")
 
 
-def save_to_csv(rows: List[Dict[str, str]], output_file: str) -> None:
-    """Save relation candidates to CSV file."""
-    fieldnames = [
-        "sentence", 
-        "entity1", "entity1_label",
-        "entity2", "entity2_label",
-        "relation"
-    ]
-    
+def save_to_csv(rows: Iterable[Tuple[str, ...]], output_file: str) -> int:
+    """Save relation candidate rows to CSV file and return how many were written."""
     with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDNAMES)
+        # zip stops as soon as rows runs out, so the counter's next value is the number of rows written
+        counter = count()
+        writer.writerows(row for row, _ in zip(rows, counter))
+    
+    return next(counter)
 
 
 
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import re
+import signal
+from contextlib import suppress
+
+# Line endings recognized by universal newlines
+_NEWLINE_RE = re.compile(r"\r\n|\r|\n")
+
+
+async def _read_chunks(stream, queue: asyncio.Queue, chunk_size: int) -> None:
+    """Read the stream into the queue ahead of the consumer; None marks the end"""
+    try:
+        while True:
+            data = await stream.read(chunk_size)
+            if not data:
+                break
+            await queue.put(data)
+    except asyncio.CancelledError:
+        # Cancelled by the consumer, which no longer reads the queue, so never wait for room here
+        with suppress(asyncio.QueueFull):
+            queue.put_nowait(None)
+        raise
+    except Exception:
+        # The consumer is still reading: end its loop, it then surfaces the error by awaiting this task
+        await queue.put(None)
+        raise
+    # Wait for room at EOF so the end marker is never dropped
+    await queue.put(None)
+
+
+async def stream_output(process, write, chunk_size: int = 65536, prefetch: int = 64) -> int:
+    """Forward an asyncio subprocess's stdout to write() in line-aligned chunks and return its exit code"""
+    # A reader task keeps pulling from the pipe while the previous chunk is being written out
+    queue = asyncio.Queue(maxsize=prefetch)
+    reader = asyncio.ensure_future(_read_chunks(process.stdout, queue, chunk_size))
+    pending = bytearray()
+
+    try:
+        while True:
+            data = await queue.get()
+            if data is None:
+                break
+            pending += data
+
+            # Only hand over complete lines; keep the partial tail for the next read. Like universal newlines,
+            # \r\n and a lone \r (progress bar redraws) end a line too; a trailing \r waits in case \n follows
+            end = len(pending) - 1 if pending.endswith(b"\r") else len(pending)
+            cut = max(pending.rfind(b"\n", 0, end), pending.rfind(b"\r", 0, end))
+            if cut == -1:
+                continue
+            # Split with the terminators included so a \r\n at the cut stays one line break
+            lines = _NEWLINE_RE.split(pending[:cut + 1].decode("utf-8", errors="replace"))
+            lines.pop()
+            del pending[:cut + 1]
+            write("".join(line.strip() + "\n" for line in lines))
+
+        # Surface read errors from the reader task
+        await reader
+    finally:
+        reader.cancel()
+
+    if pending:
+        write(pending.decode("utf-8", errors="replace").strip() + "\n")
+
+    return await process.wait()
+
+
+async def stop_process_group(process, timeout: float = 2.0) -> None:
+    """Terminate a process started with start_new_session=True and its children, killing them if they linger"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        with suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        await process.wait()
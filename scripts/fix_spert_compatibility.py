@@ -4,9 +4,20 @@ Fix SpERT compatibility with newer transformers versions
 """
 
 import os
+import re
 import sys
 from pathlib import Path
 
+# AdamW moved from transformers to torch.optim
+_IMPORT_RE = re.compile(re.escape("from transformers import AdamW, BertConfig"))
+NEW_IMPORT = "from torch.optim import Optimizer, AdamW\nfrom transformers import BertConfig"
+
+# torch's AdamW has no correct_bias parameter
+_OPTIMIZER_RE = re.compile(re.escape(
+    "optimizer = AdamW(optimizer_params, lr=args.lr, weight_decay=args.weight_decay, correct_bias=False)"
+))
+NEW_OPTIMIZER = "optimizer = AdamW(optimizer_params, lr=args.lr, weight_decay=args.weight_decay)"
+
 def fix_spert_trainer():
     spert_trainer_path = Path("spert/spert/spert_trainer.py")
     
@@ -20,27 +31,18 @@ def fix_spert_trainer():
     with open(spert_trainer_path, 'r', encoding='utf-8') as f:
         content = f.read()
     
-    changes_made = False
-    
+    # Each pattern is found and replaced in a single pass; the counts tell whether anything changed
     # Fix AdamW import
-    old_import = "from transformers import AdamW, BertConfig"
-    new_import = "from torch.optim import Optimizer, AdamW\nfrom transformers import BertConfig"
-    
-    if old_import in content:
+    content, import_fixes = _IMPORT_RE.subn(lambda _: NEW_IMPORT, content)
+    if import_fixes:
         print("  Fixing AdamW import...")
-        content = content.replace(old_import, new_import)
-        changes_made = True
     
     # Remove deprecated parameter
-    old_optimizer = "optimizer = AdamW(optimizer_params, lr=args.lr, weight_decay=args.weight_decay, correct_bias=False)"
-    new_optimizer = "optimizer = AdamW(optimizer_params, lr=args.lr, weight_decay=args.weight_decay)"
-    
-    if old_optimizer in content:
+    content, optimizer_fixes = _OPTIMIZER_RE.subn(lambda _: NEW_OPTIMIZER, content)
+    if optimizer_fixes:
         print("  Removing deprecated parameter...")
-        content = content.replace(old_optimizer, new_optimizer)
-        changes_made = True
     
-    if changes_made:
+    if import_fixes + optimizer_fixes:
         with open(spert_trainer_path, 'w', encoding='utf-8') as f:
             f.write(content)
         print("SpERT compatibility fixed!")